@@ -43,16 +43,19 @@ INSTALLED_APPS = [
     'posts',
     'rest_framework',
     'rest_framework_simplejwt',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'monitoring.middleware.SQLInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -99,6 +102,17 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -144,17 +158,69 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     ),
 }
 
+POSTS_PAGE_SIZE = config('POSTS_PAGE_SIZE', default=20, cast=int)
+POSTS_MAX_PAGE_SIZE = config('POSTS_MAX_PAGE_SIZE', default=100, cast=int)
+POSTS_CACHE_TIMEOUT = config('POSTS_CACHE_TIMEOUT', default=300, cast=int)
+# How often each process checks whether its copy of the categories is stale.
+POSTS_CATEGORY_CHECK_INTERVAL = config('POSTS_CATEGORY_CHECK_INTERVAL', default=5, cast=float)
+POSTS_BULK_MAX_ITEMS = config('POSTS_BULK_MAX_ITEMS', default=1000, cast=int)
+# Export watermarks trail the export's start by this many seconds, so writes
+# whose transactions were still open when it ran are picked up next time.
+POSTS_EXPORT_WATERMARK_LAG = config('POSTS_EXPORT_WATERMARK_LAG', default=60, cast=float)
+# 'background' (thread + process pool), 'sync' (inline after commit) or 'off'.
+POSTS_IMAGE_PROCESSING = config('POSTS_IMAGE_PROCESSING', default='background')
+POSTS_IMAGE_WORKERS = config('POSTS_IMAGE_WORKERS', default=2, cast=int)
+
+# Authenticated users are resolved from a per-process cache for this many
+# seconds (0 disables it), optionally backed by a shared cache alias.
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=30, cast=int)
+USER_CACHE_MAX_SIZE = config('USER_CACHE_MAX_SIZE', default=1024, cast=int)
+USER_CACHE_ALIAS = config('USER_CACHE_ALIAS', default='')
+
+# Per-request SQL accounting, see monitoring.middleware. Budgets are query
+# counts per request; SQL_QUERY_BUDGETS overrides them by URL view name.
+# Off in production unless asked for; CI turns it on with SQL_INSTRUMENTATION=1.
+SQL_INSTRUMENTATION = config('SQL_INSTRUMENTATION', default=DEBUG, cast=bool)
+SQL_INSTRUMENTATION_HEADERS = config('SQL_INSTRUMENTATION_HEADERS', default=DEBUG, cast=bool)
+SQL_QUERY_BUDGET = config('SQL_QUERY_BUDGET', default=50, cast=int)
+SQL_QUERY_BUDGETS = {}
+SQL_DUPLICATE_THRESHOLD = config('SQL_DUPLICATE_THRESHOLD', default=10, cast=int)
+# 'warn' logs offending requests, 'raise' fails them (useful in tests and CI).
+SQL_BUDGET_ACTION = config('SQL_BUDGET_ACTION', default='warn')
+
+# Opt-in request profiling, see monitoring.middleware.ProfilingMiddleware.
+PROFILING = config('PROFILING', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_HEADER = config('PROFILING_HEADER', default='X-Profile')
+# The header must carry this value to force a profile; empty disables it.
+PROFILING_SECRET = config('PROFILING_SECRET', default='')
+PROFILING_MAX_VIEWS = config('PROFILING_MAX_VIEWS', default=100, cast=int)
+# Also write every sample here so dump_profiles can merge all workers' samples.
+PROFILING_DIR = config('PROFILING_DIR', default='')
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=50, cast=int)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_USE_TLS = True
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+
+# Lifetime of password-reset codes, in seconds.
+OTP_TTL = config('OTP_TTL', default=300, cast=int)
+
+# Outbound mail queue, delivered by `manage.py send_queued_mail`. Delays are in seconds.
+EMAIL_QUEUE_BATCH_SIZE = config('EMAIL_QUEUE_BATCH_SIZE', default=50, cast=int)
+EMAIL_QUEUE_MAX_ATTEMPTS = config('EMAIL_QUEUE_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_QUEUE_RETRY_DELAY = config('EMAIL_QUEUE_RETRY_DELAY', default=30, cast=int)
+EMAIL_QUEUE_MAX_RETRY_DELAY = config('EMAIL_QUEUE_MAX_RETRY_DELAY', default=3600, cast=int)
+EMAIL_QUEUE_LEASE = config('EMAIL_QUEUE_LEASE', default=300, cast=int)
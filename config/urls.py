@@ -20,5 +20,6 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('user.urls')),
-    path('api/v2/', include('posts.urls'))
+    path('api/v2/', include('posts.urls')),
+    path('api/monitoring/', include('monitoring.urls'))
 ]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.profiling import SORT_KEYS, load_samples, sample_directory, top_functions
+
+
+class Command(BaseCommand):
+    help = 'Merge the profile samples written to PROFILING_DIR and print the hottest functions per view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.PROFILING_DIR, help='Sample directory (default: PROFILING_DIR).')
+        parser.add_argument('--view', help='Only this URL view name.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='cumulative')
+
+    def handle(self, *args, **options):
+        if not options['dir']:
+            raise CommandError('Set PROFILING_DIR or pass --dir.')
+        samples = load_samples(options['dir'])
+        if options['view']:
+            name = sample_directory('', options['view'])
+            samples = {view: sample for view, sample in samples.items() if view == name}
+        if not samples:
+            self.stdout.write('No profile samples found.')
+        for view, (count, stats) in samples.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{view} ({count} sample(s))'))
+            self.stdout.write(f'{"calls":>9} {"tottime ms":>11} {"cumtime ms":>11}  function')
+            for row in top_functions(stats, options['limit'], options['sort']):
+                self.stdout.write(
+                    f'{row["calls"]:>9} {row["total_time_ms"]:>11.2f} {row["cumulative_time_ms"]:>11.2f}  {row["function"]}'
+                )
@@ -0,0 +1,178 @@
+import cProfile
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.crypto import constant_time_compare
+
+from .profiling import get_profile_store
+from .sql import QueryRecorder
+
+logger = logging.getLogger('monitoring.sql')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Count the SQL statements, database time and repeated statement shapes of
+    every request. The totals go to the ``monitoring.sql`` logger and, with
+    SQL_INSTRUMENTATION_HEADERS, to X-DB-* response headers. A request over
+    its view's query budget or repeating one shape SQL_DUPLICATE_THRESHOLD
+    times or more is logged as a warning, or raises QueryBudgetExceeded when
+    SQL_BUDGET_ACTION is 'raise'. Budgets are looked up by URL view name in
+    SQL_QUERY_BUDGETS, falling back to SQL_QUERY_BUDGET.
+
+    Queries a streaming response runs while it is being consumed happen
+    after the middleware returns and are not counted. Off unless
+    SQL_INSTRUMENTATION is set, which defaults to DEBUG.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    def report(self, request, response, recorder):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = settings.SQL_QUERY_BUDGETS.get(view_name, settings.SQL_QUERY_BUDGET)
+        threshold = settings.SQL_DUPLICATE_THRESHOLD
+        duplicates = recorder.duplicates(threshold) if threshold else []
+        db_time_ms = recorder.duration * 1000
+
+        if settings.SQL_INSTRUMENTATION_HEADERS:
+            response['X-DB-Query-Count'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f'{db_time_ms:.2f}'
+            response['X-DB-Max-Repeats'] = str(recorder.max_repeats)
+
+        stats = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_time_ms': round(db_time_ms, 2),
+            'max_repeats': recorder.max_repeats,
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates],
+        }
+        problems = []
+        if budget is not None and recorder.count > budget:
+            problems.append(f'{recorder.count} queries, over the budget of {budget}')
+        problems += [f'{count}x {sql[:200]}' for sql, count in duplicates]
+        if not problems:
+            logger.debug('%s %s: %d queries in %.1f ms', request.method, request.path,
+                         recorder.count, db_time_ms, extra={'sql': stats})
+            return
+
+        message = '{} {} ({}): {}'.format(request.method, request.path, view_name, '; '.join(problems))
+        if settings.SQL_BUDGET_ACTION == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message, extra={'sql': stats})
+
+
+class ProfilingMiddleware:
+    """
+    Run a sample of requests under cProfile and add the profile to the
+    per-view store in monitoring.profiling. PROFILING_SAMPLE_RATE is the
+    fraction of requests sampled at random. A request whose PROFILING_HEADER
+    header equals PROFILING_SECRET is always profiled, but the result is
+    only kept when the authenticated user turns out to be staff; without a
+    secret the header is ignored, so anonymous clients can't make requests
+    pay for profiling. Put it last in MIDDLEWARE so the profile covers the
+    view rather than other middleware. Under ASGI the profile covers the
+    event loop thread while the request is awaited, so it also picks up
+    other requests running meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        requested, sampled = self.wanted(request)
+        profile = self.start(requested, sampled)
+        if profile is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+        return self.finish(request, response, profile, time.perf_counter() - started, requested, sampled)
+
+    async def __acall__(self, request):
+        requested, sampled = self.wanted(request)
+        profile = self.start(requested, sampled)
+        if profile is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.disable()
+        return self.finish(request, response, profile, time.perf_counter() - started, requested, sampled)
+
+    @staticmethod
+    def wanted(request):
+        header = request.headers.get(settings.PROFILING_HEADER)
+        requested = bool(header and settings.PROFILING_SECRET
+                         and constant_time_compare(header, settings.PROFILING_SECRET))
+        return requested, random.random() < settings.PROFILING_SAMPLE_RATE
+
+    @staticmethod
+    def start(requested, sampled):
+        if not (requested or sampled):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter.
+            return None
+        return profile
+
+    @staticmethod
+    def finish(request, response, profile, duration, requested, sampled):
+        # DRF has set request.user to the token's user by the time the view returns.
+        user = getattr(request, 'user', None)
+        is_staff = bool(user is not None and user.is_staff)
+        match = request.resolver_match
+        if match is None or not (sampled or is_staff):
+            return response
+        get_profile_store().add(match.view_name, profile, duration)
+        if requested and is_staff:
+            response['X-Profiled-View'] = match.view_name
+        return response
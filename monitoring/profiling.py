@@ -0,0 +1,126 @@
+"""
+Sampled cProfile profiles, aggregated per view.
+
+``ProfileStore`` keeps one merged ``pstats.Stats`` per URL view name for the
+views profiled most recently, up to PROFILING_MAX_VIEWS, in this process.
+When PROFILING_DIR is set every sample is also written there as a ``.prof``
+file, keeping the newest PROFILING_MAX_FILES per view, so the samples of all
+worker processes can be merged by the dump_profiles command or opened with
+any pstats viewer.
+"""
+import os
+import pstats
+import re
+import threading
+import time
+from collections import OrderedDict
+from io import StringIO
+
+from django.conf import settings
+
+SORT_KEYS = {
+    'cumulative': 3,
+    'tottime': 2,
+    'calls': 1,
+}
+
+_UNSAFE_RE = re.compile(r'[^\w.-]+')
+
+
+def format_function(key):
+    filename, lineno, name = key
+    return f'{filename}:{lineno}({name})' if filename != '~' else name
+
+
+def top_functions(stats, limit=20, sort='cumulative'):
+    """The ``limit`` hottest functions of a pstats.Stats as plain dicts."""
+    index = SORT_KEYS[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            'function': format_function(key),
+            'calls': calls,
+            'total_time_ms': round(total * 1000, 3),
+            'cumulative_time_ms': round(cumulative * 1000, 3),
+        }
+        for key, (_, calls, total, cumulative, _) in rows
+    ]
+
+
+class ProfileStore:
+    def __init__(self, max_views):
+        self.max_views = max_views
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, view_name, profile, duration):
+        stats = pstats.Stats(profile, stream=StringIO())
+        if settings.PROFILING_DIR:
+            # Before the sample is merged into (and mutated with) later ones.
+            write_sample(settings.PROFILING_DIR, view_name, stats)
+        with self._lock:
+            entry = self._views.pop(view_name, None)
+            if entry is None:
+                entry = {'requests': 0, 'duration': 0.0, 'stats': stats}
+            else:
+                entry['stats'].add(stats)
+            entry['requests'] += 1
+            entry['duration'] += duration
+            self._views[view_name] = entry
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+
+    def report(self, view_name=None, limit=20, sort='cumulative'):
+        with self._lock:
+            views = {name: entry for name, entry in self._views.items()
+                     if view_name is None or name == view_name}
+            return {
+                name: {
+                    'requests': entry['requests'],
+                    'mean_ms': round(entry['duration'] / entry['requests'] * 1000, 3),
+                    'top': top_functions(entry['stats'], limit, sort),
+                }
+                for name, entry in views.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+def sample_directory(directory, view_name):
+    return os.path.join(directory, _UNSAFE_RE.sub('_', view_name))
+
+
+def write_sample(directory, view_name, stats):
+    path = sample_directory(directory, view_name)
+    os.makedirs(path, exist_ok=True)
+    stats.dump_stats(os.path.join(path, f'{time.time_ns()}-{os.getpid()}.prof'))
+    samples = sorted(os.listdir(path))
+    for name in samples[:-settings.PROFILING_MAX_FILES]:
+        try:
+            os.remove(os.path.join(path, name))
+        except FileNotFoundError:
+            pass
+
+
+def load_samples(directory):
+    """``{view directory name: (sample count, merged pstats.Stats)}`` for the samples on disk."""
+    merged = {}
+    if not os.path.isdir(directory):
+        return merged
+    for view in sorted(os.listdir(directory)):
+        files = [os.path.join(directory, view, name) for name in sorted(os.listdir(os.path.join(directory, view)))]
+        if files:
+            merged[view] = (len(files), pstats.Stats(*files, stream=StringIO()))
+    return merged
+
+
+_store = None
+
+
+def get_profile_store():
+    global _store
+    if _store is None:
+        _store = ProfileStore(settings.PROFILING_MAX_VIEWS)
+    return _store
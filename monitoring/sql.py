@@ -0,0 +1,69 @@
+"""
+Per-request SQL accounting.
+
+``QueryRecorder`` installs an execute wrapper on every database connection
+and tallies the statements that go through it: how many, how long they
+took and how often each statement shape (its fingerprint) repeats. A shape
+that repeats within one request is the signature of an N+1 query. Only the
+distinct statements are fingerprinted, once the recording is read.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """The statement with literals and IN lists collapsed, so equal shapes compare equal."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def fingerprints(self):
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[fingerprint(sql)] += count
+        return fingerprints
+
+    def duplicates(self, threshold=2):
+        """``(fingerprint, count)`` of the shapes run at least ``threshold`` times, most repeated first."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    @property
+    def max_repeats(self):
+        return max(self.fingerprints.values(), default=0)
@@ -0,0 +1,117 @@
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from posts.models import Post
+from user.models import CustomUser
+from .middleware import ProfilingMiddleware, QueryBudgetExceeded, SQLInstrumentationMiddleware
+from .profiling import get_profile_store
+from .sql import QueryRecorder, fingerprint
+
+
+class QueryRecorderTests(TestCase):
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s, %s) LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE a = 'y'  AND b IN (%s) LIMIT 1"),
+        )
+
+    def test_repeated_shapes_are_counted(self):
+        with QueryRecorder() as recorder:
+            for pk in range(3):
+                Post.objects.filter(pk=pk).exists()
+            CustomUser.objects.exists()
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(recorder.max_repeats, 3)
+        self.assertEqual(len(recorder.duplicates(3)), 1)
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_INSTRUMENTATION_HEADERS=True, POSTS_CACHE_TIMEOUT=0)
+class SQLInstrumentationMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_headers(self):
+        response = self.client.get(reverse('posts'))
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+        self.assertIn('X-DB-Time-Ms', response)
+
+    async def test_async_views_stay_async(self):
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(SQLInstrumentationMiddleware(get_response)))
+        response = await AsyncClient().get(
+            reverse('async-posts'), headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-DB-Query-Count', response)
+
+    @override_settings(SQL_QUERY_BUDGETS={'posts': 0})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('monitoring.sql', 'WARNING') as logs:
+            self.client.get(reverse('posts'))
+        self.assertIn('over the budget of 0', logs.output[0])
+
+    @override_settings(SQL_QUERY_BUDGETS={'posts': 0}, SQL_BUDGET_ACTION='raise')
+    def test_over_budget_can_raise(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts'))
+
+
+@override_settings(PROFILING=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_SECRET='s3cret', POSTS_CACHE_TIMEOUT=0)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.staff = CustomUser.objects.create_user('staff@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        get_profile_store().clear()
+        self.client = APIClient()
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('posts'), headers={'X-Profile': 's3cret'})
+        self.assertEqual(get_profile_store().report(), {})
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('posts'), headers={'X-Profile': 's3cret'})
+        self.assertEqual(response['X-Profiled-View'], 'posts')
+        response = self.client.get(reverse('profiles'), {'view': 'posts', 'limit': 5})
+        self.assertEqual(response.data['posts']['requests'], 1)
+        self.assertEqual(len(response.data['posts']['top']), 5)
+
+    def test_header_without_the_secret_is_not_profiled(self):
+        self.client.force_authenticate(self.staff)
+        with mock.patch('monitoring.middleware.cProfile.Profile') as profile:
+            response = self.client.get(reverse('posts'), headers={'X-Profile': '1'})
+        profile.assert_not_called()
+        self.assertNotIn('X-Profiled-View', response)
+
+    async def test_async_views_are_profiled(self):
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(get_response)))
+        response = await AsyncClient().get(reverse('async-posts'), headers={
+            'Authorization': f'Bearer {AccessToken.for_user(self.staff)}', 'X-Profile': 's3cret',
+        })
+        self.assertEqual(response['X-Profiled-View'], 'async-posts')
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_aggregated_per_view(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            self.client.get(reverse('posts'))
+        self.assertEqual(get_profile_store().report()['posts']['requests'], 2)
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 403)
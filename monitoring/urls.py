@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import ProfileReportView
+
+urlpatterns = [
+    path('profiles/', ProfileReportView.as_view(), name='profiles'),
+]
@@ -0,0 +1,30 @@
+from rest_framework import generics, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .profiling import SORT_KEYS, get_profile_store
+
+
+class ProfileReportView(generics.GenericAPIView):
+    """
+    Hottest functions per view from the profiles this process has sampled.
+    ``?view=`` limits the report to one view name, ``?limit=`` sets the
+    number of functions and ``?sort=`` is one of cumulative, tottime, calls.
+    DELETE discards the collected profiles.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        sort = request.query_params.get('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            return Response({"detail": f"sort must be one of {', '.join(SORT_KEYS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_profile_store().report(request.query_params.get('view'), limit, sort))
+
+    def delete(self, request, *args, **kwargs):
+        get_profile_store().clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
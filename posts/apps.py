@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from .search import get_backend
+
+    connection = connections[using]
+    if 'posts_post' in connection.introspection.table_names():
+        get_backend(connection).install(connection)
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        post_migrate.connect(ensure_search_index, sender=self)
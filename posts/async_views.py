@@ -0,0 +1,95 @@
+"""
+Native async versions of the hot read endpoints.
+
+DRF views are synchronous, so under ASGI every request to them holds a
+worker thread for its whole duration. These views run on the event loop,
+use the async ORM and return the same payloads as their DRF counterparts.
+Authentication and error bodies follow the REST_FRAMEWORK settings.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from .categories import registry as category_registry
+from .models import Comment, Post, afavorite_post_ids
+from .pagination import CommentCursorPagination, PostCursorPagination, SearchCursorPagination
+from .search import search_posts
+from .serializers import CommentSerializer, PostDetailSerializer, PostListSerializer
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def authenticate(request):
+    request = Request(request, authenticators=[
+        authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return request
+
+
+def api_view(view):
+    """Authenticate like IsAuthenticated and turn API exceptions into JSON responses."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render({'detail': exceptions.MethodNotAllowed(request.method).detail},
+                          status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            request = await sync_to_async(authenticate)(request)
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return render({'detail': exc.detail}, exc.status_code)
+    return wrapper
+
+
+async def render_post_page(request, queryset, paginator):
+    posts = await paginator.apaginate_queryset(queryset, request)
+    favorite_ids = await afavorite_post_ids(request.user, [post.pk for post in posts])
+    await sync_to_async(category_registry.ensure)({post.category_id for post in posts})
+    serializer = PostListSerializer(posts, many=True, context={
+        'request': request, 'favorite_post_ids': favorite_ids
+    })
+    return render({'next': paginator.get_next_link(), 'results': serializer.data})
+
+
+@api_view
+async def post_list(request):
+    return await render_post_page(request, Post.objects.for_listing(), PostCursorPagination())
+
+
+@api_view
+async def global_search(request):
+    queryset = search_posts(Post.objects.for_listing(), request.query_params.get('q', ''))
+    return await render_post_page(request, queryset, SearchCursorPagination())
+
+
+@api_view
+async def saved_posts(request):
+    return await render_post_page(request, request.user.favorite_posts.for_listing(), PostCursorPagination())
+
+
+@api_view
+async def post_detail(request, pk):
+    paginator = CommentCursorPagination()
+    # The comment page only needs the primary key, so it doesn't wait for the post row.
+    post, comments = await asyncio.gather(
+        Post.objects.select_related('author').filter(pk=pk).afirst(),
+        paginator.afirst_page(Comment.objects.filter(post_id=pk).select_related('author'), request),
+    )
+    if post is None:
+        raise exceptions.NotFound()
+    await sync_to_async(category_registry.ensure)([post.category_id])
+    data = PostDetailSerializer(post, context={'request': request}).data
+    data['comments'] = CommentSerializer(comments, many=True).data
+    data['comments_next'] = paginator.get_next_link(reverse('comment-create', args=[pk], request=request))
+    return render(data)
@@ -0,0 +1,312 @@
+"""
+Endpoint benchmarks for the benchmark_endpoints command.
+
+``seed`` fills an empty database with a synthetic dataset using
+``bulk_create`` and precomputed counters, so no signals or per-row saves run
+and millions of rows load in minutes. ``ROUTES`` describes one request per
+route of posts.urls and user.urls; ``run_route`` replays it through the
+Django test client and records latency percentiles, throughput and the
+number of SQL queries per request. Every route runs inside a transaction
+that is rolled back, so writes measured by one route never change the data
+the next one sees. ``compare`` checks a run against a stored baseline.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+from itertools import count
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.models import OTP, CustomUser
+from .counters import rebuild_category_stats
+from .models import Category, CategoryStats, Comment, Post
+
+# Satisfies user.validators.validate_password, so reset_password accepts it.
+PASSWORD = 'Benchmark-password-1!'
+READER_EMAIL = 'bench-reader@example.com'
+STAFF_EMAIL = 'bench-staff@example.com'
+
+VOLUMES = {
+    'users': 10_000,
+    'categories': 50,
+    'posts': 100_000,
+    'comments': 2_000_000,
+    'favorites': 1_000_000,
+}
+
+_SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'za', 'be', 'da', 'gu', 'pe', 'shi', 'ton')
+
+
+def _vocabulary(rng, size=500):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _sentence(rng, words, length):
+    return ' '.join(rng.choices(words, k=length))
+
+
+def seed(volumes, batch_size=5000, random_seed=0, log=print):
+    """Load ``volumes`` (keys as in VOLUMES) into the current database."""
+    rng = random.Random(random_seed)
+    words = _vocabulary(rng)
+    password = make_password(PASSWORD)
+    now = timezone.now()
+
+    users = [
+        CustomUser(email=READER_EMAIL, password=password),
+        CustomUser(email=STAFF_EMAIL, password=password, is_staff=True, is_superuser=True),
+    ] + [CustomUser(email=f'bench{i}@example.com', password=password) for i in range(volumes['users'])]
+    user_ids = [user.pk for user in CustomUser.objects.bulk_create(users, batch_size=batch_size)]
+    category_ids = [category.pk for category in Category.objects.bulk_create(
+        [Category(name=f'category {i}') for i in range(max(volumes['categories'], 1))]
+    )]
+    log(f'seeded {len(user_ids)} users and {len(category_ids)} categories')
+
+    posts_total = volumes['posts']
+    comments_per_post = volumes['comments'] / posts_total if posts_total else 0
+    favorites_per_post = min(volumes['favorites'] / posts_total if posts_total else 0, len(user_ids) / 2)
+    Favorite = Post.favorites.through
+    totals = {'posts': 0, 'comments': 0, 'favorites': 0}
+    for start in range(0, posts_total, batch_size):
+        size = min(batch_size, posts_total - start)
+        comment_counts = [rng.randint(0, round(2 * comments_per_post)) for _ in range(size)]
+        favorite_sets = [rng.sample(user_ids, rng.randint(0, round(2 * favorites_per_post))) for _ in range(size)]
+        posts = Post.objects.bulk_create([
+            Post(
+                description=_sentence(rng, words, 6),
+                text=_sentence(rng, words, 80),
+                author_id=rng.choice(user_ids),
+                category_id=rng.choice(category_ids),
+                publication_date=now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                comments_count=comment_counts[index],
+                favorites_count=len(favorite_sets[index]),
+            )
+            for index in range(size)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post_id=post.pk, author_id=rng.choice(user_ids), text=_sentence(rng, words, 20))
+            for post, comment_count in zip(posts, comment_counts)
+            for _ in range(comment_count)
+        ], batch_size=batch_size)
+        Favorite.objects.bulk_create([
+            Favorite(post_id=post.pk, customuser_id=user_id)
+            for post, favorite_ids in zip(posts, favorite_sets)
+            for user_id in favorite_ids
+        ], batch_size=batch_size)
+        totals['posts'] += size
+        totals['comments'] += sum(comment_counts)
+        totals['favorites'] += sum(map(len, favorite_sets))
+        log(f'seeded {totals["posts"]}/{posts_total} posts')
+    rebuild_category_stats(Category, Post, CategoryStats)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return totals
+
+
+class Fixtures:
+    """The users, rows and tokens the routes point their requests at."""
+
+    def __init__(self):
+        self.reader = CustomUser.objects.get(email=READER_EMAIL)
+        self.staff = CustomUser.objects.get(email=STAFF_EMAIL)
+        self.headers = {
+            None: {},
+            'reader': {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'},
+            'staff': {'Authorization': f'Bearer {AccessToken.for_user(self.staff)}'},
+        }
+        post = Post.objects.order_by('-comments_count', 'pk').select_related('category').first()
+        self.post_id = post.pk
+        self.category_id = post.category_id
+        self.category_name = post.category.name
+        self.search_term = post.description.split()[0]
+        self.since = (timezone.now() - timedelta(hours=1)).isoformat()
+        self._unique = count()
+
+    def unique(self):
+        return next(self._unique)
+
+    def new_post(self):
+        return Post.objects.create(
+            description='benchmark', text='benchmark', author=self.reader, category_id=self.category_id
+        ).pk
+
+    def new_comment(self):
+        return Comment.objects.create(post_id=self.post_id, author=self.reader, text='benchmark').pk
+
+    def favorited(self, favorite):
+        Favorite = Post.favorites.through
+        if favorite:
+            Favorite.objects.get_or_create(post_id=self.post_id, customuser_id=self.reader.pk)
+        else:
+            Favorite.objects.filter(post_id=self.post_id, customuser_id=self.reader.pk).delete()
+        return self.post_id
+
+
+class Route:
+    """
+    One request to the URL named ``name``. ``kwargs``, ``data`` and
+    ``params`` may be callables taking the Fixtures; they run before the
+    clock starts, so they can create whatever the request consumes.
+    """
+
+    def __init__(self, name, method='get', kwargs=None, data=None, params=None,
+                 user='reader', status=200, max_requests=None):
+        self.name = name
+        self.method = method
+        self.kwargs = kwargs
+        self.data = data
+        self.params = params
+        self.user = user
+        self.status = status
+        self.max_requests = max_requests
+
+    @property
+    def label(self):
+        return f'{self.method.upper()} {self.name}'
+
+    def build(self, fixtures):
+        def resolve(value):
+            return value(fixtures) if callable(value) else value
+        url = reverse(self.name, kwargs=resolve(self.kwargs))
+        return url, resolve(self.data), resolve(self.params)
+
+
+def _post(fixtures):
+    return {'pk': fixtures.post_id}
+
+
+def _bulk_posts(fixtures):
+    return [{'description': 'bulk', 'text': 'bulk', 'category': fixtures.category_id} for _ in range(100)]
+
+
+def _bulk_comments(fixtures):
+    return [{'post': fixtures.post_id, 'text': 'bulk'} for _ in range(100)]
+
+
+def _bulk_favorites(fixtures):
+    return [{'post': fixtures.post_id, 'action': action} for action in ('add', 'remove') * 50]
+
+
+def _reset_password(fixtures):
+    return {'email': fixtures.reader.email, 'otp': OTP.issue(fixtures.reader),
+            'password': PASSWORD, 'confirm_password': PASSWORD}
+
+
+ROUTES = [
+    Route('global-search', params=lambda f: {'q': f.search_term}),
+    Route('category-filter', kwargs=lambda f: {'category_name': f.category_name}),
+    Route('create_category'),
+    Route('create_category', 'post', data=lambda f: {'name': f'benchmark {f.unique()}'}, status=201),
+    Route('posts'),
+    Route('post_create', 'post', status=201, data=lambda f: {
+        'description': 'benchmark', 'text': 'benchmark', 'author': f.reader.pk, 'category': f.category_id
+    }),
+    Route('post_detail', kwargs=_post),
+    Route('post_update', 'patch', kwargs=_post, data={'text': 'edited'}, user='staff'),
+    Route('post_delete', 'delete', kwargs=lambda f: {'pk': f.new_post()}, user='staff', status=204),
+    Route('comment-create', kwargs=_post),
+    Route('comment-create', 'post', kwargs=_post, data=lambda f: {'post': f.post_id, 'text': 'benchmark'},
+          status=201),
+    Route('comment-update', 'patch', kwargs=lambda f: {'pk': f.new_comment()}, data={'text': 'edited'},
+          user='staff'),
+    Route('comment-delete', 'delete', kwargs=lambda f: {'pk': f.new_comment()}, user='staff', status=204),
+    Route('add-to-favorites', 'put', kwargs=lambda f: {'pk': f.favorited(False)}),
+    Route('remove-from-favorites', 'put', kwargs=lambda f: {'pk': f.favorited(True)}),
+    Route('favorite', 'put', kwargs=_post),
+    Route('favorite', 'delete', kwargs=_post),
+    Route('user-saved-posts'),
+    Route('posts-bulk', 'post', data=_bulk_posts, status=201),
+    Route('comments-bulk', 'post', data=_bulk_comments, status=201),
+    Route('favorites-bulk', 'post', data=_bulk_favorites),
+    Route('posts-export', params=lambda f: {'since': f.since}, user='staff', max_requests=3),
+    Route('async-global-search', params=lambda f: {'q': f.search_term}),
+    Route('async-posts'),
+    Route('async-post-detail', kwargs=_post),
+    Route('async-user-saved-posts'),
+    Route('custom-registration', 'post', user=None, status=201, data=lambda f: {
+        'email': f'registered{f.unique()}@example.com', 'password': PASSWORD, 'confirm_password': PASSWORD
+    }),
+    Route('login', 'post', user=None, data=lambda f: {'email': f.reader.email, 'password': PASSWORD}),
+    Route('forgot_password', 'post', user=None, data=lambda f: {'email': f.reader.email}),
+    Route('reset_password', 'post', user=None, data=_reset_password),
+    Route('users', user=None),
+    Route('users-export', user='staff', max_requests=3),
+]
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def run_route(client, route, fixtures, requests):
+    """Time ``requests`` requests to ``route`` (after one warm-up) and roll all their writes back."""
+    requests = min(requests, route.max_requests or requests)
+    counter = {'active': False, 'queries': 0}
+
+    def count_queries(execute, sql, params, many, context):
+        if counter['active']:
+            counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    timings, queries = [], []
+    with transaction.atomic(), connection.execute_wrapper(count_queries):
+        for iteration in range(requests + 1):
+            url, data, params = route.build(fixtures)
+            if route.method == 'get':
+                args = {'data': params}
+            else:
+                args = {'data': data, 'content_type': 'application/json'}
+            counter.update(active=True, queries=0)
+            started = time.perf_counter()
+            response = getattr(client, route.method)(url, headers=fixtures.headers[route.user], **args)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            counter['active'] = False
+            if response.status_code != route.status:
+                transaction.set_rollback(True)
+                return {'error': f'{route.label} {url} returned {response.status_code}'}
+            if iteration:
+                timings.append(elapsed)
+                queries.append(counter['queries'])
+        transaction.set_rollback(True)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'throughput': round(len(timings) / sum(timings), 1),
+        'queries': max(queries),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of ``results`` against ``baseline`` (both as written by the
+    command): a p95 more than ``threshold`` (a fraction) slower, more
+    queries per request, or a route that used to work and now errors.
+    """
+    regressions = []
+    for label, before in baseline['routes'].items():
+        after = results['routes'].get(label)
+        if after is None or 'error' in before:
+            continue
+        if 'error' in after:
+            regressions.append(f'{label}: {after["error"]}')
+            continue
+        if after['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f'{label}: p95 {before["p95_ms"]:.1f} ms -> {after["p95_ms"]:.1f} ms')
+        if after['queries'] > before['queries']:
+            regressions.append(f'{label}: {before["queries"]} -> {after["queries"]} queries per request')
+    return regressions
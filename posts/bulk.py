@@ -0,0 +1,159 @@
+"""
+Batch writes for importers and moderation tools.
+
+Each function takes the raw list of items from the request, validates every
+item without touching the database, resolves all referenced rows with one
+query per model, and writes the valid items in a single transaction with
+``bulk_create``. The result is one entry per input item, in order: either
+``{'index', 'status', ...}`` on success or ``{'index', 'status': 'error',
+'errors'}``. Signals don't fire for bulk writes, so the side effects they
+normally trigger are applied here in batch. Only staff may create posts on
+behalf of another author.
+"""
+from django.db import transaction
+from rest_framework.serializers import PrimaryKeyRelatedField
+
+from user.models import CustomUser
+from .cache import bump_content_generation, bump_user_generation
+from .models import (
+    Category,
+    Comment,
+    Post,
+    adjust_category_stats,
+    recount_favorites_counts,
+    touch_posts
+)
+from .serializers import (
+    BulkCommentItemSerializer,
+    BulkFavoriteItemSerializer,
+    BulkPostItemSerializer
+)
+
+
+def _validate(items, serializer_class):
+    results, valid = [], []
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            results.append(None)
+            valid.append((index, serializer.validated_data))
+        else:
+            results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+    return results, valid
+
+
+def _reject(results, index, field, pk):
+    message = PrimaryKeyRelatedField.default_error_messages['does_not_exist'].format(pk_value=pk)
+    results[index] = {'index': index, 'status': 'error', 'errors': {field: [message]}}
+
+
+def create_posts(items, user):
+    results, valid = _validate(items, BulkPostItemSerializer)
+    category_ids = set(Category.objects.filter(
+        pk__in={data['category'] for _, data in valid}
+    ).values_list('pk', flat=True))
+    author_ids = set(CustomUser.objects.filter(
+        pk__in={data['author'] for _, data in valid if 'author' in data}
+    ).values_list('pk', flat=True))
+
+    pending = []
+    for index, data in valid:
+        author_id = data.pop('author', user.pk)
+        if data['category'] not in category_ids:
+            _reject(results, index, 'category', data['category'])
+        elif author_id != user.pk and not user.is_staff:
+            results[index] = {'index': index, 'status': 'error',
+                              'errors': {'author': ['Only staff can create posts for other users.']}}
+        elif author_id not in author_ids and author_id != user.pk:
+            _reject(results, index, 'author', author_id)
+        else:
+            pending.append((index, Post(author_id=author_id, category_id=data.pop('category'), **data)))
+
+    with transaction.atomic():
+        created = Post.objects.bulk_create([post for _, post in pending])
+        stats = {}
+        for post in created:
+            count, latest = stats.get(post.category_id, (0, post.publication_date))
+            stats[post.category_id] = (count + 1, max(latest, post.publication_date))
+        for category_id, (count, latest) in stats.items():
+            adjust_category_stats(category_id, posts=count, published=latest)
+    for (index, _), post in zip(pending, created):
+        results[index] = {'index': index, 'status': 'created', 'id': post.pk}
+    if created:
+        bump_content_generation()
+    return results
+
+
+def create_comments(items, user):
+    results, valid = _validate(items, BulkCommentItemSerializer)
+    categories = dict(Post.objects.filter(
+        pk__in={data['post'] for _, data in valid}
+    ).values_list('pk', 'category_id'))
+
+    pending = []
+    for index, data in valid:
+        if data['post'] not in categories:
+            _reject(results, index, 'post', data['post'])
+        else:
+            pending.append((index, Comment(post_id=data['post'], author=user, text=data['text'])))
+
+    deltas, category_deltas = {}, {}
+    for _, comment in pending:
+        deltas[comment.post_id] = deltas.get(comment.post_id, 0) + 1
+        category_id = categories[comment.post_id]
+        category_deltas[category_id] = category_deltas.get(category_id, 0) + 1
+    with transaction.atomic():
+        created = Comment.objects.bulk_create([comment for _, comment in pending])
+        touch_posts(deltas)
+        for category_id, delta in category_deltas.items():
+            adjust_category_stats(category_id, comments=delta)
+    for (index, _), comment in zip(pending, created):
+        results[index] = {'index': index, 'status': 'created', 'id': comment.pk}
+    if created:
+        bump_content_generation()
+    return results
+
+
+def apply_favorites(items, user):
+    """
+    Apply add/remove operations in order; each result says whether the item
+    changed the favorite ('added', 'removed') or found it as is ('unchanged').
+    The net changes take one INSERT and one DELETE, then favorites_count
+    of the touched posts is recounted in one UPDATE.
+    """
+    results, valid = _validate(items, BulkFavoriteItemSerializer)
+    referenced = {data['post'] for _, data in valid}
+    post_ids = set(Post.objects.filter(pk__in=referenced).values_list('pk', flat=True))
+    Favorite = Post.favorites.through
+    existing = set(Favorite.objects.filter(
+        customuser_id=user.pk, post_id__in=post_ids
+    ).values_list('post_id', flat=True))
+
+    favorites = set(existing)
+    for index, data in valid:
+        post_id = data['post']
+        if post_id not in post_ids:
+            _reject(results, index, 'post', post_id)
+            continue
+        if data['action'] == 'add':
+            status = 'unchanged' if post_id in favorites else 'added'
+            favorites.add(post_id)
+        else:
+            status = 'removed' if post_id in favorites else 'unchanged'
+            favorites.discard(post_id)
+        results[index] = {'index': index, 'status': status, 'post': post_id}
+
+    added, removed = favorites - existing, existing - favorites
+    with transaction.atomic():
+        Favorite.objects.bulk_create(
+            [Favorite(post_id=post_id, customuser_id=user.pk) for post_id in added],
+            ignore_conflicts=True,
+        )
+        if removed:
+            Favorite.objects.filter(customuser_id=user.pk, post_id__in=removed).delete()
+        # Recounted rather than adjusted: a concurrent request may have added
+        # or removed the same favorites since they were read above.
+        recount_favorites_counts(added | removed)
+    if added or removed:
+        bump_user_generation(user.pk)
+    return results
@@ -0,0 +1,93 @@
+"""
+Response cache for the post listing endpoints.
+
+Keys combine the view, the query string, the requesting user and two
+generation counters: a content generation bumped on any post, comment or
+category write, and a per-user generation bumped when that user's favorites
+change. Bumping a generation orphans every key built from the old value, so
+nothing is ever enumerated or deleted and stale entries simply expire.
+Bumps wait for the current transaction to commit: a bump before the commit
+would let a concurrent request cache the old rows under the new generation.
+Cached bodies hold absolute URLs, so keys also include the scheme and host.
+"""
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+CONTENT_GENERATION_KEY = 'posts:generation'
+USER_GENERATION_KEY = 'posts:generation:user:{}'
+CATEGORY_GENERATION_KEY = 'posts:generation:categories'
+
+
+def _initial_generation():
+    # Start from the clock rather than 0 so a generation that was evicted
+    # never comes back with a value older entries were keyed on.
+    return int(time.time() * 1000)
+
+
+def _incr(key):
+    if not cache.add(key, _initial_generation(), timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), timeout=None)
+
+
+def _bump(key):
+    # Runs immediately outside a transaction.
+    transaction.on_commit(lambda: _incr(key))
+
+
+def bump_content_generation():
+    _bump(CONTENT_GENERATION_KEY)
+
+
+def bump_user_generation(user_id):
+    _bump(USER_GENERATION_KEY.format(user_id))
+
+
+def bump_category_generation():
+    _bump(CATEGORY_GENERATION_KEY)
+
+
+def get_category_generation():
+    return cache.get_or_set(CATEGORY_GENERATION_KEY, _initial_generation, timeout=None)
+
+
+def get_generations(user_id):
+    user_key = USER_GENERATION_KEY.format(user_id)
+    generations = cache.get_many([CONTENT_GENERATION_KEY, user_key])
+    missing = {key: _initial_generation() for key in (CONTENT_GENERATION_KEY, user_key)
+               if key not in generations}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        generations.update(cache.get_many(list(missing)))
+    return generations.get(CONTENT_GENERATION_KEY), generations.get(user_key)
+
+
+def response_cache_key(view_name, request):
+    user_id = request.user.pk if request.user.is_authenticated else None
+    content_generation, user_generation = get_generations(user_id)
+    query = sorted(request.query_params.lists())
+    fingerprint = repr((request.scheme, request.get_host(), request.path, query,
+                        user_id, content_generation, user_generation))
+    return f'posts:response:{view_name}:{sha256(fingerprint.encode()).hexdigest()}'
+
+
+class CachedResponseMixin:
+    """Cache ``list()`` responses under a generation-scoped, per-user key."""
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(type(self).__name__, request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.POSTS_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,92 @@
+"""
+Process-local registry of categories.
+
+Categories are few and rarely change, so every process keeps all of them in
+memory (id -> name, name -> id) and post listings and category filtering
+read them from there instead of joining or querying ``posts_category``.
+Category writes bump a generation counter in the cache backend; each process
+compares it with the generation its copy was loaded under at most every
+POSTS_CATEGORY_CHECK_INTERVAL seconds and reloads with one query when it
+moved. Coordination across processes therefore needs a shared cache backend;
+the writing process drops its copy immediately, and a lookup that misses
+checks the database before trusting the miss.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .cache import get_category_generation
+
+Snapshot = namedtuple('Snapshot', 'generation names ids')
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < settings.POSTS_CATEGORY_CHECK_INTERVAL:
+            return snapshot
+        generation = get_category_generation()
+        with self._lock:
+            if self._snapshot is None or self._snapshot.generation != generation:
+                self._snapshot = self._load(generation)
+            self._checked_at = now
+            return self._snapshot
+
+    def _load(self, generation):
+        from .models import Category
+
+        names = dict(Category.objects.values_list('pk', 'name'))
+        return Snapshot(
+            generation=generation,
+            names=names,
+            ids={name: pk for pk, name in names.items()},
+        )
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def id_for(self, name):
+        """The id of the category called ``name``, or None."""
+        category_id = self.snapshot().ids.get(name)
+        if category_id is None:
+            from .models import Category
+
+            # Created or renamed in another process since this copy was
+            # loaded? One indexed lookup, so unknown names can't force reloads.
+            category_id = Category.objects.filter(name=name).values_list('pk', flat=True).first()
+            if category_id is not None:
+                self.invalidate()
+        return category_id
+
+    def get(self, category_id):
+        """``{'id', 'name'}`` as CategorySerializer renders it."""
+        name = self.snapshot().names.get(category_id)
+        if name is None:
+            # A post can only point at an existing category, so a miss means
+            # it was created elsewhere after this copy was loaded.
+            self.invalidate()
+            name = self.snapshot().names.get(category_id)
+        return {'id': category_id, 'name': name}
+
+    def ensure(self, category_ids):
+        """
+        Reload now if any of ``category_ids`` is unknown. Async views call it
+        through sync_to_async before serializing, so that get() never has to
+        query from the event loop.
+        """
+        names = self.snapshot().names
+        if any(category_id not in names for category_id in category_ids):
+            self.invalidate()
+            self.snapshot()
+
+
+registry = CategoryRegistry()
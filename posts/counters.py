@@ -0,0 +1,72 @@
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _reconcile(post_model, field, rows, batch_size):
+    """
+    Set ``field`` on every post to the number of ``rows`` pointing at it, one
+    primary key range at a time so a large table is never locked in a single
+    statement. ``rows`` is a queryset with a ``post`` foreign key.
+    """
+    actual = Coalesce(Subquery(
+        rows.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(count=Count('pk')).values('count')
+    ), Value(0))
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            post_model.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return fixed
+        fixed += (
+            post_model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            .exclude(**{field: actual})
+            .update(**{field: actual})
+        )
+        last_id = ids[-1]
+
+
+def reconcile_comments_count(post_model, comment_model, batch_size=10000):
+    """
+    Recompute ``Post.comments_count`` from the comment rows. Returns the
+    number of posts whose counter was corrected.
+    """
+    return _reconcile(post_model, 'comments_count', comment_model.objects.all(), batch_size)
+
+
+def reconcile_favorites_count(post_model, batch_size=10000):
+    """
+    Recompute ``Post.favorites_count`` from the favorites through table.
+    Returns the number of posts whose counter was corrected.
+    """
+    return _reconcile(post_model, 'favorites_count', post_model.favorites.through.objects.all(), batch_size)
+
+
+def rebuild_category_stats(category_model, post_model, stats_model):
+    """
+    Recompute every category's stats with one aggregate query over posts
+    and write them with one upsert. Returns the number of categories.
+    """
+    totals = {
+        row['category']: row for row in
+        post_model.objects.order_by().values('category').annotate(
+            posts=Count('pk'), comments=Sum('comments_count'), latest=Max('publication_date')
+        )
+    }
+    stats = []
+    for category_id in category_model.objects.values_list('pk', flat=True):
+        row = totals.get(category_id, {})
+        stats.append(stats_model(
+            category_id=category_id,
+            posts_count=row.get('posts', 0),
+            comments_count=row.get('comments') or 0,
+            latest_post_date=row.get('latest'),
+        ))
+    stats_model.objects.bulk_create(
+        stats, update_conflicts=True, unique_fields=['category'],
+        update_fields=['posts_count', 'comments_count', 'latest_post_date'],
+    )
+    return len(stats)
@@ -1,14 +1,33 @@
+from datetime import datetime
+from functools import lru_cache
+
 from django.utils import timezone
 
+RUSSIAN_MONTHS = (
+    None, 'янв', 'февр', 'марта', 'апр', 'мая', 'июня',
+    'июля', 'авг', 'сент', 'окт', 'нояб', 'дек'
+)
+
+
+def _format(local_time):
+    return f"{local_time.day:02d} {RUSSIAN_MONTHS[local_time.month]} в {local_time.hour:02d}:{local_time.minute:02d}"
+
+
+@lru_cache(maxsize=8192)
+def _format_minute(minute, tz):
+    local_time = datetime.fromtimestamp(minute * 60, tz)
+    if local_time.utcoffset().seconds % 60:
+        # Historical offsets with seconds (LMT) don't fall on minute boundaries.
+        return None
+    return _format(local_time)
+
+
+def format_localized_datetime(datetime_obj, tz=None):
+    if tz is None:
+        tz = timezone.get_current_timezone()
+    if datetime_obj.tzinfo is not None:
+        formatted = _format_minute(int(datetime_obj.timestamp() // 60), tz)
+        if formatted is not None:
+            return formatted
+    return _format(datetime_obj.astimezone(tz))
 
-def format_localized_datetime(datetime_obj):
-    russian_months = {
-        1: 'янв', 2: 'февр', 3: 'марта', 4: 'апр', 5: 'мая', 6: 'июня',
-        7: 'июля', 8: 'авг', 9: 'сент', 10: 'окт', 11: 'нояб', 12: 'дек'
-    }
-    local_time = datetime_obj.astimezone(timezone.get_current_timezone())
-    return "{day} {month} в {time}".format(
-        day=local_time.strftime("%d"),
-        month=russian_months[local_time.month],
-        time=local_time.strftime("%H:%M")
-    )
@@ -0,0 +1,131 @@
+"""
+NDJSON export of posts, optionally with their comments, for bulk consumers.
+
+Posts are read in keyset batches with ``values()`` so no model instances or
+serializers are built, and each batch is written out before the next one is
+read; memory use depends on the batch size, not on the table. A full export
+walks the primary key; an incremental one walks ``(updated_at, id)`` on its
+index. Within a batch posts come out in primary key order. Comments, when
+requested, are streamed with one query per batch of posts and each post is
+written as soon as its comments are in, so only one post's comments are
+held at a time.
+
+An export started at time T returns T - POSTS_EXPORT_WATERMARK_LAG as its
+watermark. Passing it back as ``since`` exports only posts whose
+``updated_at`` is at or after it, which includes posts that gained, lost or
+changed comments since then. ``updated_at`` is set before the writing
+transaction commits, so a post stamped just before T can become visible only
+after this export has passed it; the lag makes the next export include it,
+as long as no write transaction stays open longer than the lag. Posts near
+the watermark are therefore usually exported twice, never skipped.
+
+Deleted posts leave no trace an incremental export could report, so
+consumers that must drop them need a periodic full export.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post
+
+BATCH_SIZE = 1000
+COMMENT_CHUNK_SIZE = 2000
+
+POST_FIELDS = (
+    'id', 'description', 'text', 'photo', 'publication_date', 'updated_at', 'comments_count',
+    'category_id', 'category__name', 'author_id', 'author__email',
+)
+COMMENT_FIELDS = ('id', 'post_id', 'author_id', 'author__email', 'text', 'created_at', 'updated_at')
+
+
+def parse_since(value):
+    """Parse an ISO 8601 ``since`` value; naive times are taken as the current time zone."""
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f'{value!r} is not an ISO 8601 datetime.')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def format_watermark(watermark):
+    # 'Z' rather than '+00:00', which would need escaping in a query string.
+    return watermark.isoformat().replace('+00:00', 'Z')
+
+
+def _post_row(values):
+    return {
+        'id': values['id'],
+        'description': values['description'],
+        'text': values['text'],
+        'photo': values['photo'] or None,
+        'publication_date': values['publication_date'],
+        'updated_at': values['updated_at'],
+        'category': {'id': values['category_id'], 'name': values['category__name']},
+        'author': {'id': values['author_id'], 'email': values['author__email']},
+        'comments_count': values['comments_count'],
+    }
+
+
+def _comment_row(values):
+    return {
+        'id': values['id'],
+        'author': {'id': values['author_id'], 'email': values['author__email']},
+        'text': values['text'],
+        'created_at': values['created_at'],
+        'updated_at': values['updated_at'],
+    }
+
+
+def _with_comments(rows):
+    """Attach each row's comments, yielding every row as soon as its comments are complete."""
+    comments = iter(
+        Comment.objects.filter(post_id__in=[row['id'] for row in rows])
+        .order_by('post_id', 'created_at', 'id').values(*COMMENT_FIELDS).iterator(chunk_size=COMMENT_CHUNK_SIZE)
+    )
+    pending = next(comments, None)
+    for row in rows:
+        row['comments'] = []
+        while pending is not None and pending['post_id'] == row['id']:
+            row['comments'].append(_comment_row(pending))
+            pending = next(comments, None)
+        yield row
+
+
+def iter_posts(since=None, comments=False, batch_size=BATCH_SIZE):
+    """Yield one dict per post, see the module docstring."""
+    queryset = Post.objects.values(*POST_FIELDS)
+    if since is None:
+        queryset = queryset.order_by('id')
+    else:
+        queryset = queryset.filter(updated_at__gte=since).order_by('updated_at', 'id')
+    after = Q()
+    while True:
+        batch = list(queryset.filter(after)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        if since is None:
+            after = Q(id__gt=last['id'])
+        else:
+            after = Q(updated_at__gt=last['updated_at']) | Q(updated_at=last['updated_at'], id__gt=last['id'])
+        rows = sorted((_post_row(values) for values in batch), key=lambda row: row['id'])
+        if comments:
+            yield from _with_comments(rows)
+        else:
+            yield from rows
+
+
+def export_posts(since=None, comments=False, batch_size=BATCH_SIZE):
+    """
+    Return ``(watermark, lines)``: the time to pass as ``since`` next time and
+    an iterator of NDJSON lines.
+    """
+    watermark = timezone.now() - timedelta(seconds=settings.POSTS_EXPORT_WATERMARK_LAG)
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = (encoder.encode(row) + '\n' for row in iter_posts(since, comments, batch_size))
+    return watermark, lines
@@ -0,0 +1,148 @@
+"""
+Off-request generation of resized WebP variants for ``Post.photo``.
+
+Saving a post with a new photo schedules ``process_post_photo`` on a small
+thread pool once the transaction commits, so the upload request returns as
+soon as the original is stored. The thread reads the original through the
+storage backend, hands the CPU-bound Pillow work to a process pool, stores
+the variants next to the original and records their names on the post.
+The process pool is started with 'spawn': forking a multithreaded web
+worker could hand the children locks held by other threads. When a photo
+is replaced, the variants of the old one are deleted once the save commits.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_content_generation
+
+logger = logging.getLogger(__name__)
+
+# name -> bounding box; the variant keeps the aspect ratio and never upscales.
+VARIANTS = {
+    'thumbnail': (320, 320),
+    'large': (1280, 1280),
+}
+WEBP_QUALITY = 80
+
+_threads = None
+_processes = None
+
+
+def render_variants(data, variants=VARIANTS, quality=WEBP_QUALITY):
+    """Return ``{name: webp_bytes}`` for the image in ``data``. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        rendered = {}
+        for name, size in variants.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            output = BytesIO()
+            variant.save(output, 'WEBP', quality=quality, method=4)
+            rendered[name] = output.getvalue()
+    return rendered
+
+
+def variant_name(source_name, variant):
+    stem, _ = os.path.splitext(os.path.basename(source_name))
+    return f'{stem}_{variant}.webp'
+
+
+def _process_pool():
+    global _processes
+    if _processes is None:
+        _processes = ProcessPoolExecutor(max_workers=settings.POSTS_IMAGE_WORKERS,
+                                         mp_context=multiprocessing.get_context('spawn'))
+    return _processes
+
+
+def _thread_pool():
+    global _threads
+    if _threads is None:
+        _threads = ThreadPoolExecutor(max_workers=settings.POSTS_IMAGE_WORKERS,
+                                      thread_name_prefix='post-photos')
+    return _threads
+
+
+def process_post_photo(post_id, source_name, use_processes=True):
+    """
+    Build and store the variants of ``source_name`` and attach them to the
+    post, unless its photo has been replaced in the meantime. Returns True
+    when the post was updated.
+    """
+    from .models import Post
+
+    field = Post._meta.get_field('photo')
+    with field.storage.open(source_name, 'rb') as source:
+        data = source.read()
+    if use_processes:
+        rendered = _process_pool().submit(render_variants, data).result()
+    else:
+        rendered = render_variants(data)
+
+    directory = os.path.dirname(source_name)
+    names = {
+        f'photo_{variant}': field.storage.save(
+            os.path.join(directory, variant_name(source_name, variant)), ContentFile(content)
+        )
+        for variant, content in rendered.items()
+    }
+    updated = Post.objects.filter(pk=post_id, photo=source_name).update(
+        version=F('version') + 1, updated_at=timezone.now(), **names
+    )
+    if updated:
+        bump_content_generation()
+    else:
+        for name in names.values():
+            field.storage.delete(name)
+    return bool(updated)
+
+
+def _run_in_background(post_id, source_name):
+    try:
+        process_post_photo(post_id, source_name)
+    except Exception:
+        logger.exception('Failed to build photo variants for post %s', post_id)
+    finally:
+        connections.close_all()
+
+
+def discard_photo_variants(names):
+    """Delete the variant files in ``names`` from storage once the current transaction commits."""
+    from .models import Post
+
+    storage = Post._meta.get_field('photo_thumbnail').storage
+
+    def delete():
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError:
+                logger.warning('Failed to delete stale photo variant %s', name, exc_info=True)
+
+    if names:
+        transaction.on_commit(delete)
+
+
+def schedule_post_photo(post):
+    """Build the photo variants for ``post`` after the current transaction commits."""
+    mode = settings.POSTS_IMAGE_PROCESSING
+    if mode == 'off' or not post.photo:
+        return
+    post_id, source_name = post.pk, post.photo.name
+    if mode == 'sync':
+        transaction.on_commit(lambda: process_post_photo(post_id, source_name, use_processes=False))
+    else:
+        transaction.on_commit(lambda: _thread_pool().submit(_run_in_background, post_id, source_name))
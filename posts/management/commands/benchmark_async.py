@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from posts.models import Post
+from user.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent-request throughput of the async read endpoints with '
+            'their sync DRF counterparts, in-process, against the configured database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--email', help='User to authenticate as (default: first active user).')
+        parser.add_argument('--query', default='a', help='Search query for the search endpoints.')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.filter(is_active=True).order_by('pk')
+        user = users.filter(email=options['email']).first() if options['email'] else users.first()
+        post = Post.objects.order_by('-pk').first()
+        if user is None or post is None:
+            raise CommandError('Need at least one active user and one post to benchmark against.')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        search = f'?q={options["query"]}'
+        endpoints = [
+            ('post list', reverse('posts'), reverse('async-posts')),
+            ('post detail', reverse('post_detail', args=[post.pk]), reverse('async-post-detail', args=[post.pk])),
+            ('search', reverse('global-search') + search, reverse('async-global-search') + search),
+            ('saved posts', reverse('user-saved-posts'), reverse('async-user-saved-posts')),
+        ]
+
+        # Measure the work itself, not the response cache in front of the sync views.
+        with override_settings(POSTS_CACHE_TIMEOUT=0, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.stdout.write(f'{"endpoint":<12} {"sync req/s":>11} {"async req/s":>12} {"ratio":>6}')
+            for label, sync_url, async_url in endpoints:
+                sync_rate = self.run_sync(sync_url, headers, options['requests'], options['concurrency'])
+                async_rate = asyncio.run(
+                    self.run_async(async_url, headers, options['requests'], options['concurrency'])
+                )
+                self.stdout.write(f'{label:<12} {sync_rate:>11.1f} {async_rate:>12.1f} {async_rate / sync_rate:>5.2f}x')
+
+    def run_sync(self, url, headers, requests, concurrency):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            response = local.client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise CommandError(f'GET {url} returned {response.status_code}')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(fetch, range(requests)))
+        return requests / (time.perf_counter() - started)
+
+    async def run_async(self, url, headers, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with semaphore:
+                response = await client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise CommandError(f'GET {url} returned {response.status_code}')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
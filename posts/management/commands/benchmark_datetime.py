@@ -0,0 +1,51 @@
+import random
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.datetime import format_localized_datetime
+
+
+def legacy_format_localized_datetime(datetime_obj):
+    russian_months = {
+        1: 'янв', 2: 'февр', 3: 'марта', 4: 'апр', 5: 'мая', 6: 'июня',
+        7: 'июля', 8: 'авг', 9: 'сент', 10: 'окт', 11: 'нояб', 12: 'дек'
+    }
+    local_time = datetime_obj.astimezone(timezone.get_current_timezone())
+    return "{day} {month} в {time}".format(
+        day=local_time.strftime("%d"),
+        month=russian_months[local_time.month],
+        time=local_time.strftime("%H:%M")
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-call cost of format_localized_datetime with the original implementation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=1000,
+                            help='Number of distinct datetimes, spread over the last 30 days.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        rng = random.Random(0)
+        values = [now - timedelta(seconds=rng.randrange(30 * 24 * 3600)) for _ in range(options['samples'])]
+
+        mismatches = [value for value in values
+                      if format_localized_datetime(value) != legacy_format_localized_datetime(value)]
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f'{len(mismatches)} outputs differ, e.g. {mismatches[0]!r}'))
+
+        calls = len(values) * options['repeat']
+        results = {
+            'legacy': timeit.timeit(lambda: [legacy_format_localized_datetime(v) for v in values],
+                                    number=options['repeat']),
+            'cached': timeit.timeit(lambda: [format_localized_datetime(v) for v in values],
+                                    number=options['repeat']),
+        }
+        for name, seconds in results.items():
+            self.stdout.write(f'{name:>8}: {seconds / calls * 1e9:8.0f} ns/call')
+        self.stdout.write(f'speedup: {results["legacy"] / results["cached"]:.1f}x')
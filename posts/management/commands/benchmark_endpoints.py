@@ -0,0 +1,107 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+
+from posts.benchmarks import ROUTES, VOLUMES, Fixtures, compare, run_route, seed
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and measure latency percentiles, throughput and '
+            'query counts for every posts and user route; optionally fail on regressions '
+            'against a baseline results file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplier for the seeded volumes (1.0 = 100k posts, 2M comments, 1M favorites).')
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per route.')
+        parser.add_argument('--routes', nargs='*', help='Only routes whose URL name is listed.')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--baseline', help='Results file to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed p95 slowdown against the baseline, as a fraction.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database (and reuse an already seeded one).')
+        parser.add_argument('--with-cache', action='store_true', help='Leave the listing response cache on.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        routes = [route for route in ROUTES if not options['routes'] or route.name in options['routes']]
+        self.warn_about_unmeasured_routes()
+
+        volumes = {name: round(volume * options['scale']) for name, volume in VOLUMES.items()}
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False)
+        try:
+            if Post.objects.exists():
+                self.stdout.write('Reusing the seeded test database.')
+            else:
+                volumes.update(seed(volumes, random_seed=options['seed'], log=self.stdout.write))
+            results = self.measure(routes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        results['meta'] = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'volumes': volumes,
+            'requests': options['requests'],
+            'cache': options['with_cache'],
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        self.stdout.write(f'Results written to {options["output"]}.')
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against {}:\n  {}'.format(
+                    options['baseline'], '\n  '.join(regressions)
+                ))
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}.'))
+
+    def measure(self, routes, options):
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'POSTS_IMAGE_PROCESSING': 'off'}
+        if not options['with_cache']:
+            overrides['POSTS_CACHE_TIMEOUT'] = 0
+        results = {'routes': {}}
+        with override_settings(**overrides):
+            fixtures = Fixtures()
+            client = Client()
+            self.stdout.write(f'{"route":<32} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"queries":>7}')
+            for route in routes:
+                result = run_route(client, route, fixtures, options['requests'])
+                results['routes'][route.label] = result
+                if 'error' in result:
+                    self.stderr.write(self.style.ERROR(f'{route.label:<32} {result["error"]}'))
+                    continue
+                self.stdout.write(
+                    f'{route.label:<32} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                    f'{result["p99_ms"]:>9.2f} {result["throughput"]:>8.1f} {result["queries"]:>7}'
+                )
+        return results
+
+    def warn_about_unmeasured_routes(self):
+        measured = {route.name for route in ROUTES}
+        for pattern in get_resolver().url_patterns:
+            module = getattr(pattern, 'urlconf_module', None)
+            if getattr(module, '__name__', None) not in ('posts.urls', 'user.urls'):
+                continue
+            for entry in pattern.url_patterns:
+                if entry.name and entry.name not in measured:
+                    self.stderr.write(self.style.WARNING(f'No benchmark for route {entry.name!r}.'))
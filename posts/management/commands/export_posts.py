@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import BATCH_SIZE, export_posts, format_watermark, parse_since
+
+
+class Command(BaseCommand):
+    help = ('Write posts with their category, author and comment count as NDJSON. '
+            'The watermark to pass as --since next time is printed to stderr. '
+            'Deleted posts are not reported, run without --since to pick them up.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only posts updated at or after this ISO 8601 time.')
+        parser.add_argument('--comments', action='store_true', help='Nest each post\'s comments.')
+        parser.add_argument('--output', help='File to write to (default: stdout).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        watermark, lines = export_posts(since, options['comments'], options['batch_size'])
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            output.writelines(lines)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f'watermark: {format_watermark(watermark)}')
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.images import process_post_photo
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Build missing thumbnail and large WebP variants for post photos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Process at most this many posts.')
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild variants even for posts that already have them.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['all']:
+            posts = posts.filter(photo_thumbnail__isnull=True)
+        pending = list(posts.order_by('pk').values_list('pk', 'photo')[:options['limit']])
+
+        def process(item):
+            try:
+                return process_post_photo(*item)
+            except Exception as exc:
+                self.stderr.write(f'Post {item[0]}: {exc}')
+                return False
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=settings.POSTS_IMAGE_WORKERS) as executor:
+            done = sum(executor.map(process, pending))
+        self.stdout.write(self.style.SUCCESS(f'Built photo variants for {done} of {len(pending)} post(s).'))
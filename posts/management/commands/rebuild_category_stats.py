@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_category_stats
+from posts.models import Category, CategoryStats, Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-category post count, comment total and latest post date.'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_category_stats(Category, Post, CategoryStats)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {rebuilt} category(ies).'))
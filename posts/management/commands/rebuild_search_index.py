@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index for posts and re-index every row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        backend = get_backend(connection)
+        backend.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt post search index ({type(backend).__name__}).'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comments_count, reconcile_favorites_count
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.comments_count and Post.favorites_count from the underlying rows and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_comments_count(Post, Comment, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Corrected comments_count on {fixed} post(s).'))
+        fixed = reconcile_favorites_count(Post, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Corrected favorites_count on {fixed} post(s).'))
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from posts.search import get_backend
+
+
+def install_search_index(apps, schema_editor):
+    get_backend(schema_editor.connection).install(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    get_backend(schema_editor.connection).uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_total_comments'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
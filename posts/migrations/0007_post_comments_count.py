@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+from posts.counters import reconcile_comments_count
+
+
+def backfill_comments_count(apps, schema_editor):
+    reconcile_comments_count(apps.get_model('posts', 'Post'), apps.get_model('posts', 'Comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='post',
+            old_name='total_comments',
+            new_name='comments_count',
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def verify_comment_links(apps, schema_editor):
+    """
+    Refuse to drop the Post.comments through table while it links a comment
+    to a different post than Comment.post, which is what every read now uses.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Through = Post.comments.through
+    mismatched = (
+        Through.objects.using(schema_editor.connection.alias)
+        .exclude(comment__post_id=models.F('post_id'))
+        .values_list('post_id', 'comment_id')
+    )
+    sample = list(mismatched[:10])
+    if sample:
+        raise RuntimeError(
+            f'{mismatched.count()} Post.comments row(s) disagree with Comment.post, '
+            f'e.g. (post_id, comment_id) {sample}. Fix them before migrating.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(verify_comment_links, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='comments',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.post'),
+        ),
+    ]
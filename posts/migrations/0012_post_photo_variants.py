@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_remove_post_comments_m2m'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='photo_large',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='post_photos/'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='post_photos/'),
+        ),
+    ]
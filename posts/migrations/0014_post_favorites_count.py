@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+from posts.counters import reconcile_favorites_count
+
+
+def backfill_favorites_count(apps, schema_editor):
+    reconcile_favorites_count(apps.get_model('posts', 'Post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search_index_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_favorites_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from posts.counters import rebuild_category_stats
+
+
+def build_category_stats(apps, schema_editor):
+    rebuild_category_stats(
+        apps.get_model('posts', 'Category'), apps.get_model('posts', 'Post'), apps.get_model('posts', 'CategoryStats')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.category')),
+                ('posts_count', models.IntegerField(default=0)),
+                ('comments_count', models.IntegerField(default=0)),
+                ('latest_post_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_category_stats, migrations.RunPython.noop),
+    ]
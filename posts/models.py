@@ -1,10 +1,14 @@
 from django.utils import timezone
-from django.db import models
-from django.db.models import Count
-from django.db.models.signals import post_save
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, DateTimeField, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 
 from user.models import CustomUser
+from .cache import bump_category_generation, bump_content_generation, bump_user_generation
+from .categories import registry as category_registry
+from .images import discard_photo_variants, schedule_post_photo
 
 
 class Category(models.Model):
@@ -14,38 +18,399 @@ class Category(models.Model):
         return self.name
 
 
+class CategoryStats(models.Model):
+    """
+    Per-category totals, kept up to date by the post and comment signals and
+    the bulk write paths; rebuild_category_stats recomputes them from scratch.
+    """
+    category = models.OneToOneField(Category, primary_key=True, on_delete=models.CASCADE, related_name='stats')
+    posts_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    latest_post_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.category_id}: {self.posts_count} posts, {self.comments_count} comments'
+
+
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Everything PostListSerializer reads, fetched in the same query as the
+        posts; categories come from posts.categories.
+        """
+        return self.select_related('author')
+
+
 class Post(models.Model):
     description = models.CharField(max_length=255)
     text = models.TextField()
     photo = models.ImageField(upload_to='post_photos/', blank=True, null=True)
+    # WebP renditions of ``photo`` built in the background, see posts.images.
+    photo_thumbnail = models.ImageField(upload_to='post_photos/', blank=True, null=True, editable=False)
+    photo_large = models.ImageField(upload_to='post_photos/', blank=True, null=True, editable=False)
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    comments = models.ManyToManyField("Comment", related_name='post_comments')
     publication_date = models.DateTimeField(default=timezone.now)
     favorites = models.ManyToManyField(CustomUser, related_name='favorite_posts', blank=True)
+    comments_count = models.IntegerField(default=0, editable=False)
+    favorites_count = models.IntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every change to the post or its comments; drives the detail ETag.
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    # Maintained with atomic F() updates, never written back from an instance.
+    COUNTER_FIELDS = ('comments_count', 'favorites_count')
+    # Filled in by the photo pipeline; only written by save() when the photo changes.
+    PHOTO_VARIANT_FIELDS = ('photo_thumbnail', 'photo_large')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination: (publication_date, id) ranges for the feed and per category.
+            models.Index(fields=['-publication_date', '-id'], name='post_pub_date_id_idx'),
+            models.Index(fields=['category', '-publication_date', '-id'], name='post_category_pub_date_id_idx'),
+            # Incremental exports: updated_at >= since.
+            models.Index(fields=['updated_at', 'id'], name='post_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.description
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_photo_name = instance.__dict__.get('photo') or None
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_publication_date = instance.__dict__.get('publication_date')
+        return instance
+
+    @property
+    def photo_changed(self):
+        return getattr(self, '_loaded_photo_name', None) != (self.photo.name or None)
+
     def save(self, *args, **kwargs):
-        self.total_comments = self.comments.count()
+        photo_changed = self.photo_changed
+        stale_variants = []
+        if photo_changed:
+            if not self._state.adding:
+                # From the row: the variants may have been attached after this instance was loaded.
+                stored = Post.objects.filter(pk=self.pk).values_list(*self.PHOTO_VARIANT_FIELDS).first() or ()
+                stale_variants = [name for name in stored if name]
+            self.photo_thumbnail = self.photo_large = None
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            skipped = self.COUNTER_FIELDS if photo_changed else self.COUNTER_FIELDS + self.PHOTO_VARIANT_FIELDS
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+            self.version = F('version') + 1
         super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            # Load the incremented value rather than leave the expression behind.
+            self.refresh_from_db(fields=['version'])
+        if photo_changed:
+            self._loaded_photo_name = self.photo.name or None
+            discard_photo_variants(stale_variants)
+            schedule_post_photo(self)
+
+
+class PostSearchIndex(models.Model):
+    """
+    The SQLite FTS5 table over post text, mapped so searches can join it.
+    Created and kept in sync by posts.search, never written through the ORM.
+    The table only exists on SQLite: other backends must not join
+    ``search_index``, only SQLiteSearchBackend does.
+    """
+    post = models.OneToOneField(
+        Post, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index'
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+
+
+def favorite_post_ids_queryset(user, post_ids):
+    return (
+        Post.favorites.through.objects
+        .filter(customuser_id=user.pk, post_id__in=post_ids)
+        .values_list('post_id', flat=True)
+    )
+
 
+def favorite_post_ids(user, post_ids):
+    """Return the subset of ``post_ids`` that ``user`` has favorited, in one query."""
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return set(favorite_post_ids_queryset(user, post_ids))
 
 
+async def afavorite_post_ids(user, post_ids):
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return {post_id async for post_id in favorite_post_ids_queryset(user, post_ids)}
+
+
+def per_post(deltas):
+    """A CASE picking each post's value out of ``{post_id: delta}``, for counter UPDATEs."""
+    return Case(
+        *(When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()),
+        default=Value(0),
+    )
+
+
+def adjust_favorites_counts(deltas):
+    """Apply ``{post_id: delta}`` to favorites_count in one UPDATE; returns the rows matched."""
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    return Post.objects.filter(pk__in=deltas).update(favorites_count=F('favorites_count') + per_post(deltas))
+
+
+def recount_favorites_counts(post_ids):
+    """Set favorites_count of ``post_ids`` to their favorite rows' count in one UPDATE."""
+    if not post_ids:
+        return 0
+    favorites = (
+        Post.favorites.through.objects.filter(post_id=OuterRef('pk'))
+        .order_by().values('post_id').annotate(total=Count('pk')).values('total')
+    )
+    return Post.objects.filter(pk__in=post_ids).update(favorites_count=Coalesce(Subquery(favorites), 0))
+
+
+def add_favorite(post_id, user_id):
+    """
+    Favorite a post with one INSERT into the through table and one counter
+    UPDATE. Returns False when it already was a favorite and raises
+    Post.DoesNotExist for an unknown post.
+    """
+    try:
+        with transaction.atomic():
+            Post.favorites.through.objects.create(post_id=post_id, customuser_id=user_id)
+            if not adjust_favorites_counts({post_id: 1}):
+                raise Post.DoesNotExist(f'Post {post_id} does not exist.')
+    except IntegrityError:
+        return False
+    bump_user_generation(user_id)
+    return True
+
+
+def remove_favorite(post_id, user_id):
+    """Unfavorite a post with one DELETE and, if a row went away, one counter UPDATE."""
+    with transaction.atomic():
+        deleted, _ = Post.favorites.through.objects.filter(post_id=post_id, customuser_id=user_id).delete()
+        if deleted:
+            adjust_favorites_counts({post_id: -deleted})
+    if deleted:
+        bump_user_generation(user_id)
+    return bool(deleted)
+
 
 class Comment(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_comments')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author} - {self.post}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_post_id = instance.__dict__.get('post_id')
+        return instance
+
+
+def touch_post(post_id, comments_delta=0):
+    """Bump a post's version and adjust its comment counter in one UPDATE."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + comments_delta,
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def touch_posts(comment_deltas):
+    """touch_post() for many posts in one UPDATE, given ``{post_id: comments_delta}``."""
+    if not comment_deltas:
+        return
+    Post.objects.filter(pk__in=comment_deltas).update(
+        comments_count=F('comments_count') + per_post(comment_deltas),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+
 
+def adjust_category_stats(category_id, posts=0, comments=0, published=None, recount_latest=False):
+    """
+    Apply deltas to one category's stats in a single UPDATE. ``published``
+    raises latest_post_date to it; ``recount_latest`` looks the latest date
+    up again, which the (category, publication_date) index makes cheap.
+    ``comments`` may be an expression, see stored_comments_count().
+    """
+    changes = {'posts_count': F('posts_count') + posts, 'comments_count': F('comments_count') + comments}
+    if recount_latest:
+        changes['latest_post_date'] = Subquery(
+            Post.objects.filter(category_id=OuterRef('category_id'))
+            .order_by('-publication_date').values('publication_date')[:1]
+        )
+    elif published is not None:
+        published = Value(published, output_field=DateTimeField())
+        changes['latest_post_date'] = Greatest(Coalesce('latest_post_date', published), published)
+    CategoryStats.objects.filter(category_id=category_id).update(**changes)
+
+
+def stored_comments_count(post_id):
+    # The instance's comments_count goes stale as comments come and go.
+    return Subquery(Post.objects.filter(pk=post_id).values('comments_count')[:1])
+
+
+def adjust_category_comments(post_id, delta):
+    """Add ``delta`` to the comment total of the post's category."""
+    CategoryStats.objects.filter(
+        category_id=Subquery(Post.objects.filter(pk=post_id).values('category_id')[:1])
+    ).update(comments_count=F('comments_count') + delta)
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, **kwargs):
+    if created:
+        CategoryStats.objects.get_or_create(category=instance)
+
+
+@receiver(post_save, sender=Category)
+def touch_category_posts(sender, instance, created, **kwargs):
+    # Post payloads embed the category name, so a rename must change their
+    # ETag and Last-Modified (and put them in the next incremental export).
+    if not created:
+        Post.objects.filter(category=instance).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Post)
+def update_category_stats_on_post_save(sender, instance, created, **kwargs):
+    loaded_category_id = getattr(instance, '_loaded_category_id', None)
+    if created:
+        adjust_category_stats(instance.category_id, posts=1, comments=instance.comments_count,
+                              published=instance.publication_date)
+    elif loaded_category_id is not None and loaded_category_id != instance.category_id:
+        comments = stored_comments_count(instance.pk)
+        adjust_category_stats(loaded_category_id, posts=-1, comments=-comments, recount_latest=True)
+        adjust_category_stats(instance.category_id, posts=1, comments=comments,
+                              published=instance.publication_date)
+    elif instance.publication_date != getattr(instance, '_loaded_publication_date', None):
+        adjust_category_stats(instance.category_id, recount_latest=True)
+    instance._loaded_category_id = instance.category_id
+    instance._loaded_publication_date = instance.publication_date
+
+
+def mark_deleted_with_post(origin, post_id):
+    # Kept on the delete's origin (the instance or queryset .delete() was
+    # called on), so the mark lives exactly as long as that one delete.
+    if origin is not None:
+        origin.__dict__.setdefault('_deleting_post_ids', set()).add(post_id)
+
+
+def deleted_with_post(origin, post_id):
+    return post_id in getattr(origin, '_deleting_post_ids', ())
+
+
+@receiver(pre_delete, sender=Post)
+def update_category_stats_on_post_delete(sender, instance, origin=None, **kwargs):
+    # Its comments' post_delete skip the counters (deleted_with_post), so
+    # they go here, while the post row still holds their count.
+    mark_deleted_with_post(origin, instance.pk)
+    adjust_category_stats(instance.category_id, posts=-1, comments=-stored_comments_count(instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def recount_category_latest_post(sender, instance, **kwargs):
+    adjust_category_stats(instance.category_id, recount_latest=True)
+
+
+@receiver(post_save, sender=Comment)
+def update_post_comments_count(sender, instance, created, **kwargs):
+    if created:
+        touch_post(instance.post_id, 1)
+        adjust_category_comments(instance.post_id, 1)
+        return
+    loaded_post_id = getattr(instance, '_loaded_post_id', None)
+    if loaded_post_id is not None and loaded_post_id != instance.post_id:
+        touch_post(loaded_post_id, -1)
+        touch_post(instance.post_id, 1)
+        adjust_category_comments(loaded_post_id, -1)
+        adjust_category_comments(instance.post_id, 1)
+    else:
+        touch_post(instance.post_id)
+    instance._loaded_post_id = instance.post_id
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_post_comments_count(sender, instance, origin=None, **kwargs):
+    # Whatever the origin (the post, its author, its category), a comment
+    # removed along with its post is already accounted for by the post.
+    if not deleted_with_post(origin, instance.post_id):
+        touch_post(instance.post_id, -1)
+        adjust_category_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, **kwargs):
+    category_registry.invalidate()
+    bump_category_generation()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
 @receiver(post_save, sender=Comment)
-def update_post_comments_count(sender, instance, **kwargs):
-    post = instance.post
-    post.total_comments = post.comments.count()
-    post.save()
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_listings(sender, **kwargs):
+    bump_content_generation()
+
+
+@receiver(m2m_changed, sender=Post.favorites.through)
+def invalidate_cached_favorites(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        bump_user_generation(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            bump_user_generation(user_id)
+    else:
+        # post.favorites.clear() doesn't say whose favorites changed.
+        bump_content_generation()
+
+
+def favorite_rows(instance, reverse, pk_set):
+    """Post ids of the existing through rows an m2m_changed call refers to, one per row."""
+    rows = Post.favorites.through.objects.filter(**{'customuser_id' if reverse else 'post_id': instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{'post_id__in' if reverse else 'customuser_id__in': pk_set})
+    return rows.values_list('post_id', flat=True)
+
+
+@receiver(m2m_changed, sender=Post.favorites.through)
+def update_favorites_count(sender, instance, action, reverse, pk_set, **kwargs):
+    # remove() reports the pks it was given, not the rows it deleted, so the
+    # rows are looked up before they go.
+    if action in ('pre_remove', 'pre_clear'):
+        instance._favorites_deltas = {}
+        for post_id in favorite_rows(instance, reverse, pk_set):
+            instance._favorites_deltas[post_id] = instance._favorites_deltas.get(post_id, 0) - 1
+    elif action in ('post_remove', 'post_clear'):
+        adjust_favorites_counts(instance.__dict__.pop('_favorites_deltas', {}))
+    elif action == 'post_add' and pk_set:
+        # add() only reports the rows it actually inserted.
+        adjust_favorites_counts(dict.fromkeys(pk_set, 1) if reverse else {instance.pk: len(pk_set)})
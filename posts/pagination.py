@@ -0,0 +1,165 @@
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite ordering whose last column is unique,
+    e.g. ``('-publication_date', '-id')``. The cursor carries the ordering
+    values of the last row served, so every page is a single index range
+    scan and page N costs the same as page 1.
+    """
+    ordering = ('-publication_date', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @property
+    def page_size(self):
+        return settings.POSTS_PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.POSTS_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.build_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.build_page([row async for row in self.page_queryset(queryset, request)])
+
+    def first_page(self, queryset, request):
+        """
+        The first page at the default size, ignoring cursor and page size
+        parameters on ``request``; for pages embedded in another resource.
+        """
+        return self.build_page(list(self.page_queryset(queryset, request, first=True)))
+
+    async def afirst_page(self, queryset, request):
+        return self.build_page([row async for row in self.page_queryset(queryset, request, first=True)])
+
+    def page_queryset(self, queryset, request, first=False):
+        """The requested page plus one row, which tells whether a next page exists."""
+        self.request = request
+        self.model = queryset.model
+        if first:
+            self.page_size_value = self.page_size
+            position = None
+        else:
+            self.page_size_value = self.get_page_size(request)
+            position = self.decode_cursor(request)
+        return self.filter_queryset(queryset, position)[:self.page_size_value + 1]
+
+    def filter_queryset(self, queryset, position):
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset
+
+    def build_page(self, rows):
+        page = rows[:self.page_size_value]
+        self.next_position = None
+        if len(rows) > self.page_size_value:
+            last = page[-1]
+            self.next_position = [getattr(last, field.lstrip('-')) for field in self.ordering]
+        return page
+
+    def after(self, position):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{field.lstrip("-")}__{lookup}': position[index]})
+            for previous, value in zip(self.ordering[:index], position):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [self.to_python(self.model, field, value) for field, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, field, value):
+        """The cursor value for ``field``; raises ValueError, TypeError or ValidationError when it is forged."""
+        if value is None or isinstance(value, bool):
+            raise ValueError
+        try:
+            model_field = model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are floats.
+            value = float(value)
+            if not math.isfinite(value):
+                raise ValueError
+            return value
+        value = model_field.to_python(value)
+        # Range checks, so an out-of-range id can't reach the database.
+        model_field.run_validators(value)
+        return value
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in position]
+        return urlsafe_b64encode(json.dumps(values).encode('ascii')).decode('ascii')
+
+    def get_next_link(self, url=None):
+        if self.next_position is None:
+            return None
+        if url is None:
+            url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PostCursorPagination(KeysetPagination):
+    ordering = ('-publication_date', '-id')
+
+
+class SearchCursorPagination(KeysetPagination):
+    # search_rank is a float8 on every backend (see posts.search), which JSON
+    # round-trips exactly, so ties on the last row of a page stay ties.
+    ordering = ('-search_rank', '-id')
+
+
+class CommentCursorPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
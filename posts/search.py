@@ -0,0 +1,173 @@
+"""
+Full-text search over posts.
+
+On PostgreSQL the index is a stored generated ``search_vector`` tsvector
+column on ``posts_post`` with a GIN index. On SQLite it is an external
+content FTS5 table fed by triggers. In both cases the database itself keeps
+the index in sync with post inserts, updates and deletes, so ORM saves,
+``bulk_create``, queryset updates and cascades are all covered.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'posts_post_fts'
+GIN_INDEX = 'posts_post_search_vector_gin'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SQLITE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, text)
+        VALUES (new.id, new.description, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, text)
+        VALUES ('delete', old.id, old.description, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, text)
+        VALUES ('delete', old.id, old.description, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, description, text)
+        VALUES (new.id, new.description, new.text);
+    END
+    """,
+)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+class PostgresSearchBackend:
+    vector = (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')"
+    )
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ({self.vector}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} ON posts_post USING GIN (search_vector)"
+            )
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {GIN_INDEX}")
+            cursor.execute("ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector")
+
+    def rebuild(self, connection):
+        # The generated column can't drift from the row, only the index can bloat.
+        self.install(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {GIN_INDEX}")
+
+    def search(self, queryset, tokens):
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        params = (SEARCH_CONFIG, tsquery)
+        return queryset.filter(
+            RawSQL('"posts_post"."search_vector" @@ to_tsquery(%s::regconfig, %s)',
+                   params, output_field=BooleanField())
+        ).annotate(
+            # float8, not ts_rank_cd's float4: a float4 doesn't survive the
+            # round trip through a cursor, and ties would be skipped or repeated.
+            search_rank=RawSQL('ts_rank_cd("posts_post"."search_vector", to_tsquery(%s::regconfig, %s))::float8',
+                               params, output_field=FloatField())
+        )
+
+
+class SQLiteSearchBackend:
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_%'],
+            )
+            if cursor.fetchone()[0] == len(_SQLITE_TRIGGERS):
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"description, text, content='posts_post', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            for trigger in _SQLITE_TRIGGERS:
+                cursor.execute(trigger)
+            # Triggers are dropped whenever SQLite remakes posts_post during a
+            # migration, so anything written meanwhile has to be re-indexed.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def rebuild(self, connection):
+        self.install(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+    def search(self, queryset, tokens):
+        # Join the FTS table (mapped by PostSearchIndex) so MATCH drives the
+        # query and bm25() is computed once per hit, not in a subquery per row.
+        match = ' '.join('"{}"*'.format(token) for token in tokens)
+        return queryset.filter(search_index__isnull=False).filter(
+            RawSQL(f'"{FTS_TABLE}" MATCH %s', (match,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'-bm25("{FTS_TABLE}", 2.0, 1.0)', (), output_field=FloatField())
+        )
+
+
+class FallbackSearchBackend:
+    """Unindexed substring search for databases without a native engine."""
+
+    def install(self, connection):
+        pass
+
+    def uninstall(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def search(self, queryset, tokens):
+        condition = Q()
+        for token in tokens:
+            condition &= Q(description__icontains=token) | Q(text__icontains=token)
+        return queryset.filter(condition).annotate(
+            search_rank=RawSQL('0', (), output_field=FloatField())
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_posts(queryset, query):
+    """
+    Filter ``queryset`` down to posts matching every word of ``query``
+    (prefix match) and annotate them with ``search_rank``, higher is better.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.annotate(search_rank=RawSQL('0', (), output_field=FloatField()))
+    return get_backend(connections[queryset.db]).search(queryset, tokens)
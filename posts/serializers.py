@@ -1,14 +1,28 @@
 from rest_framework import serializers
 
+from django.utils import timezone
+from django.utils.functional import cached_property
+
 from user.models import CustomUser
 from .models import (
     Category,
     Post,
     Comment
 )
+from .categories import registry as category_registry
 from .datetime import format_localized_datetime
 
 
+def build_photo_url(photo, request):
+    """Mirror serializers.ImageField: absolute URL when there is a request."""
+    if not photo:
+        return None
+    url = photo.url
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -21,6 +35,34 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    """A category with its materialized stats; expects ``select_related('stats')``."""
+    posts_count = serializers.SerializerMethodField()
+    comments_count = serializers.SerializerMethodField()
+    latest_post_date = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'posts_count', 'comments_count', 'latest_post_date')
+
+    def _stats(self, obj):
+        return getattr(obj, 'stats', None)
+
+    def get_posts_count(self, obj):
+        stats = self._stats(obj)
+        return stats.posts_count if stats else 0
+
+    def get_comments_count(self, obj):
+        stats = self._stats(obj)
+        return stats.comments_count if stats else 0
+
+    def get_latest_post_date(self, obj):
+        stats = self._stats(obj)
+        if stats is None or stats.latest_post_date is None:
+            return None
+        return format_localized_datetime(stats.latest_post_date)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer()
     created_at = serializers.SerializerMethodField()
@@ -41,36 +83,76 @@ class CommentCreateSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer()
-    category = CategorySerializer()
+    category = serializers.SerializerMethodField()
+    photo = serializers.SerializerMethodField()
     publication_date = serializers.SerializerMethodField()
     is_favorite = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = ('id', 'description', 'text', 'photo', 'author',
                   'category', 'publication_date', 'comments_count', 'is_favorite')
 
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def get_photo(self, obj):
+        return build_photo_url(obj.photo_thumbnail or obj.photo, self.context.get('request'))
+
+    def get_category(self, obj):
+        return category_registry.get(obj.category_id)
 
     def get_publication_date(self, obj):
         return format_localized_datetime(obj.publication_date)
 
     def get_is_favorite(self, obj):
+        favorite_ids = self.context.get('favorite_post_ids')
+        if favorite_ids is not None:
+            return obj.pk in favorite_ids
         user = self.context['request'].user
-        return user in obj.favorites.all()
+        return user.is_authenticated and obj.favorites.filter(pk=user.pk).exists()
+
+
+class PostListSerializer(serializers.BaseSerializer):
+    """
+    Read-only equivalent of PostSerializer for the list endpoints. Builds the
+    same payload with plain attribute access instead of DRF's per-field
+    machinery, so it expects posts from ``Post.objects.for_listing()`` and
+    the ``favorite_post_ids`` context set up by the list views.
+    """
+
+    def to_representation(self, post):
+        author = post.author
+        return {
+            'id': post.id,
+            'description': post.description,
+            'text': post.text,
+            'photo': build_photo_url(post.photo_thumbnail or post.photo, self.context.get('request')),
+            'author': {'id': author.id, 'email': author.email},
+            'category': category_registry.get(post.category_id),
+            'publication_date': format_localized_datetime(post.publication_date, self.timezone),
+            'comments_count': post.comments_count,
+            'is_favorite': post.pk in self.context.get('favorite_post_ids', ()),
+        }
+
+    @cached_property
+    def timezone(self):
+        # One child instance serializes the whole page; resolve the zone once.
+        return timezone.get_current_timezone()
 
 
 class PostDetailSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer()
-    category = CategorySerializer()
-    comments = CommentSerializer(many=True)
+    category = serializers.SerializerMethodField()
+    photo = serializers.SerializerMethodField()
     publication_date = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ('id', 'description', 'text', 'photo', 'author', 'category', 'publication_date', 'comments')
+        fields = ('id', 'description', 'text', 'photo', 'author', 'category', 'publication_date')
+
+    def get_photo(self, obj):
+        return build_photo_url(obj.photo_large or obj.photo, self.context.get('request'))
+
+    def get_category(self, obj):
+        return category_registry.get(obj.category_id)
 
     def get_publication_date(self, obj):
         return format_localized_datetime(obj.publication_date)
@@ -87,3 +169,21 @@ class PostCreateUpdateSerializer(serializers.ModelSerializer):
 
     def get_publication_date(self, obj):
         return format_localized_datetime(obj.publication_date)
+
+
+class BulkPostItemSerializer(serializers.Serializer):
+    description = serializers.CharField(max_length=255)
+    text = serializers.CharField()
+    category = serializers.IntegerField()
+    author = serializers.IntegerField(required=False)
+    publication_date = serializers.DateTimeField(required=False)
+
+
+class BulkCommentItemSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    text = serializers.CharField()
+
+
+class BulkFavoriteItemSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=('add', 'remove'))
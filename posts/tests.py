@@ -1,3 +1,831 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.models import CustomUser
+from . import images
+from .benchmarks import compare, percentile
+from .bulk import apply_favorites, create_comments, create_posts
+from .categories import registry as category_registry
+from .counters import rebuild_category_stats
+from .datetime import format_localized_datetime
+from .export import iter_posts, parse_since
+from .images import process_post_photo, render_variants
+from .management.commands.benchmark_datetime import legacy_format_localized_datetime
+from .models import Category, CategoryStats, Comment, Post, adjust_favorites_counts
+from .search import FTS_TABLE
+from .serializers import PostListSerializer, PostSerializer
+
+
+@override_settings(POSTS_CATEGORY_CHECK_INTERVAL=3600)
+class PostListQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        authors = [CustomUser.objects.create_user(f'author{i}@example.com', 'password') for i in range(3)]
+        categories = [Category.objects.create(name=f'category {i}') for i in range(3)]
+        cls.category = categories[0]
+        for i in range(30):
+            post = Post.objects.create(
+                description=f'post {i}', text='text', author=authors[i % 3], category=categories[i % 3]
+            )
+            if i % 2:
+                post.favorites.add(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        category_registry.invalidate()
+        category_registry.snapshot()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, url, total, count):
+        for page_size in (1, 5, 20):
+            with self.assertNumQueries(count):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), min(page_size, total))
+
+    def test_post_list_query_count_is_independent_of_page_size(self):
+        self.assertConstantQueries(reverse('posts'), 30, 2)
+
+    def test_category_filter_query_count_is_independent_of_page_size(self):
+        self.assertConstantQueries(reverse('category-filter', args=[self.category.name]), 10, 2)
+
+    def test_saved_posts_query_count_is_independent_of_page_size(self):
+        self.assertConstantQueries(reverse('user-saved-posts'), 15, 2)
+
+    def test_list_serializer_matches_post_serializer(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        posts = list(Post.objects.for_listing().order_by('id'))
+        favorite_ids = set(self.user.favorite_posts.values_list('id', flat=True))
+
+        flat = PostListSerializer(posts, many=True, context={
+            'request': request, 'favorite_post_ids': favorite_ids
+        }).data
+        full = PostSerializer(posts, many=True, context={'request': request}).data
+
+        self.assertEqual(flat, [dict(item) for item in full])
+
+
+@override_settings(POSTS_CACHE_TIMEOUT=0)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        category = Category.objects.create(name='news')
+        tied = timezone.now()
+        cls.posts = [
+            Post.objects.create(description=f'django {i}', text='text', author=cls.user, category=category,
+                                publication_date=tied if i < 4 else tied - timedelta(days=i))
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_next_links_walk_the_feed_across_tied_dates(self):
+        ids = self.walk(f"{reverse('posts')}?page_size=2")
+        # Newest first; the four posts sharing a date are ordered by id.
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts[:4])] + [post.pk for post in self.posts[4:]])
+
+    def test_next_links_walk_search_results(self):
+        self.assertEqual(sorted(self.walk(f"{reverse('global-search')}?q=django&page_size=2")),
+                         [post.pk for post in self.posts])
+
+    def test_forged_cursors_are_not_found(self):
+        def cursor(values):
+            return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+        for name, values in (
+            ('posts', [None, 1]),
+            ('posts', ['abc', 1]),
+            ('posts', [[1], 1]),
+            ('posts', [timezone.now().isoformat(), 2 ** 70]),
+            ('posts', [timezone.now().isoformat()]),
+            ('global-search', ['abc', 1]),
+            ('global-search', [[1], 1]),
+            ('global-search', [None, 1]),
+            ('global-search', [True, 1]),
+        ):
+            with self.subTest(name=name, values=values):
+                response = self.client.get(reverse(name), {'q': 'django', 'cursor': cursor(values)})
+                self.assertEqual(response.status_code, 404)
+        for encoded in ('not base64!', cursor({'a': 1}), 'W05hTiwgMV0='):  # the last is [NaN, 1]
+            with self.subTest(encoded=encoded):
+                self.assertEqual(self.client.get(reverse('global-search'), {'q': 'django', 'cursor': encoded}).status_code, 404)
+
+
+@override_settings(POSTS_CACHE_TIMEOUT=300)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.other = CustomUser.objects.create_user('other@example.com', 'password')
+        cls.category = Category.objects.create(name='news')
+        cls.post = Post.objects.create(description='post', text='text', author=cls.other, category=cls.category)
+        cls.post.favorites.add(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('posts'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def assertCached(self, user):
+        with self.assertNumQueries(0):
+            return self.get(user)
+
+    def test_is_favorite_is_cached_per_user(self):
+        self.assertTrue(self.get(self.user)[0]['is_favorite'])
+        self.assertFalse(self.get(self.other)[0]['is_favorite'])
+        self.assertTrue(self.assertCached(self.user)[0]['is_favorite'])
+        self.assertFalse(self.assertCached(self.other)[0]['is_favorite'])
+
+    def test_post_and_comment_writes_refresh_the_listing(self):
+        self.get(self.user)
+        self.assertCached(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Post.objects.create(description='newer', text='text', author=self.other, category=self.category)
+        self.assertEqual([row['id'] for row in self.get(self.user)], [newer.pk, self.post.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.other, text='comment')
+        self.assertEqual(self.get(self.user)[1]['comments_count'], 1)
+
+    def test_favorite_toggle_refreshes_only_that_users_listing(self):
+        self.get(self.user)
+        self.get(self.other)
+        self.client.force_authenticate(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('favorite', args=[self.post.pk]))
+        self.assertTrue(self.get(self.other)[0]['is_favorite'])
+        self.assertTrue(self.assertCached(self.user)[0]['is_favorite'])
+
+    def test_generations_move_only_when_the_write_commits(self):
+        self.get(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.create(description='newer', text='text', author=self.other, category=self.category)
+            # Still inside the writing transaction: a reader caches under the old generation.
+            self.assertEqual(len(self.assertCached(self.user)), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.get(self.user)), 2)
+
+    def test_responses_are_cached_per_host(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('posts'), HTTP_HOST='one.example.com')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('posts'), HTTP_HOST='one.example.com')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts'), HTTP_HOST='two.example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+
+@override_settings(POSTS_CATEGORY_CHECK_INTERVAL=3600)
+class CategoryRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.category = Category.objects.create(name='news')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category_registry.invalidate()
+
+    def test_category_list_reads_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('create_category'))
+        self.assertEqual(response.data, [{
+            'id': self.category.pk, 'name': 'news', 'posts_count': 0, 'comments_count': 0, 'latest_post_date': None,
+        }])
+
+    def test_writes_refresh_the_registry(self):
+        self.assertEqual(category_registry.id_for('news'), self.category.pk)
+        self.category.name = 'politics'
+        self.category.save()
+        self.assertIsNone(category_registry.id_for('news'))
+        self.assertEqual(category_registry.get(self.category.pk), {'id': self.category.pk, 'name': 'politics'})
+
+    def test_categories_written_elsewhere_are_found(self):
+        category_registry.snapshot()
+        # As if another process had written them: no invalidation here.
+        with mock.patch('posts.models.category_registry.invalidate'):
+            sport = Category.objects.create(name='sport')
+        self.assertEqual(category_registry.id_for('sport'), sport.pk)
+        self.assertEqual(category_registry.get(sport.pk), {'id': sport.pk, 'name': 'sport'})
+
+    def test_unknown_category_filter_is_empty(self):
+        response = self.client.get(reverse('category-filter', args=['missing']))
+        self.assertEqual(response.data['results'], [])
+
+
+class CategoryStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('author@example.com', 'password')
+        cls.news = Category.objects.create(name='news')
+        cls.sport = Category.objects.create(name='sport')
+
+    def stats(self, category):
+        return CategoryStats.objects.values_list(
+            'posts_count', 'comments_count', 'latest_post_date'
+        ).get(category=category)
+
+    def create_post(self, category, **kwargs):
+        return Post.objects.create(description='post', text='text', author=self.user, category=category, **kwargs)
+
+    def assertMatchesRebuild(self):
+        incremental = list(CategoryStats.objects.order_by('pk').values())
+        rebuild_category_stats(Category, Post, CategoryStats)
+        self.assertEqual(incremental, list(CategoryStats.objects.order_by('pk').values()))
+
+    def test_posts_and_comments_update_their_category(self):
+        older = self.create_post(self.news)
+        newer = self.create_post(self.news)
+        Comment.objects.create(post=older, author=self.user, text='first')
+        Comment.objects.create(post=older, author=self.user, text='second').delete()
+        self.assertEqual(self.stats(self.news), (2, 1, newer.publication_date))
+
+        newer.delete()
+        self.assertEqual(self.stats(self.news), (1, 1, older.publication_date))
+        older.delete()
+        self.assertEqual(self.stats(self.news), (0, 0, None))
+        self.assertMatchesRebuild()
+
+    def test_moving_a_post_moves_its_stats(self):
+        post = self.create_post(self.news)
+        Comment.objects.create(post=post, author=self.user, text='comment')
+        post.refresh_from_db()
+        post.category = self.sport
+        post.save()
+        self.assertEqual(self.stats(self.news), (0, 0, None))
+        self.assertEqual(self.stats(self.sport), (1, 1, post.publication_date))
+        self.assertMatchesRebuild()
+
+    def test_bulk_writes_update_stats(self):
+        create_posts([{'description': 'post', 'text': 'text', 'category': self.sport.pk}] * 3, self.user)
+        post_id = Post.objects.values_list('pk', flat=True).first()
+        create_comments([{'post': post_id, 'text': 'comment'}] * 2, self.user)
+        self.assertEqual(self.stats(self.sport)[:2], (3, 2))
+        self.assertMatchesRebuild()
+
+    def test_deleting_a_user_does_not_count_comments_twice(self):
+        other = CustomUser.objects.create_user('other@example.com', 'password')
+        kept = Post.objects.create(description='kept', text='text', author=other, category=self.news)
+        for post in (self.create_post(self.news), self.create_post(self.news)):
+            Comment.objects.create(post=post, author=self.user, text='own')
+            Comment.objects.create(post=post, author=other, text='other')
+        Comment.objects.create(post=kept, author=self.user, text='own')
+        Comment.objects.create(post=kept, author=other, text='other')
+
+        self.user.delete()
+        self.assertEqual(self.stats(self.news)[:2], (1, 1))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_repairs_drift(self):
+        self.create_post(self.news)
+        CategoryStats.objects.update(posts_count=42, comments_count=7, latest_post_date=None)
+        CategoryStats.objects.filter(category=self.sport).delete()
+        self.assertEqual(rebuild_category_stats(Category, Post, CategoryStats), 2)
+        self.assertEqual(self.stats(self.news)[:2], (1, 0))
+        self.assertEqual(self.stats(self.sport), (0, 0, None))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Exercises the SQLite FTS5 index.')
+@override_settings(POSTS_CACHE_TIMEOUT=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.category = Category.objects.create(name='news')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, description, text='text'):
+        return Post.objects.create(description=description, text=text, author=self.user, category=self.category)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('global-search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def drop_triggers(self):
+        # What SQLite does to them when a migration remakes posts_post.
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER {FTS_TABLE}_{suffix}')
+
+    def test_matches_every_word_by_prefix_and_ranks_descriptions_first(self):
+        in_text = self.create_post('other', 'django signals explained')
+        in_description = self.create_post('django signals', 'text')
+        self.create_post('django', 'text')
+        self.assertEqual(self.search('Djan sig'), [in_description.pk, in_text.pk])
+        self.assertEqual(self.search('missing'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = self.create_post('django')
+        post.description = 'flask'
+        post.save()
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(self.search('flask'), [post.pk])
+        Post.objects.filter(pk=post.pk).update(text='bottle')
+        self.assertEqual(self.search('bottle'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('flask'), [])
+
+    def test_pages_through_results(self):
+        posts = [self.create_post(f'django {i}', 'django ' * (i + 1)) for i in range(5)]
+        url, ids = f"{reverse('global-search')}?q=django&page_size=2", []
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(ids), [post.pk for post in posts])
+        self.assertEqual(ids, self.search('django', page_size=10))
+
+    def test_post_migrate_reinstalls_the_index_after_a_table_remake(self):
+        self.drop_triggers()
+        post = self.create_post('django')
+        self.assertEqual(self.search('django'), [])
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+        self.assertEqual(self.search('django'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('django'), [])
+
+    def test_rebuild_search_index(self):
+        post = self.create_post('django')
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(self.search('django'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('SQLiteSearchBackend', out.getvalue())
+        self.assertEqual(self.search('django'), [post.pk])
+
+
+@override_settings(POSTS_CACHE_TIMEOUT=0)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        category = Category.objects.create(name='news')
+        cls.posts = [
+            Post.objects.create(description=f'django {i}', text='text', author=cls.user, category=category)
+            for i in range(3)
+        ]
+        cls.posts[0].favorites.add(cls.user)
+        for i in range(3):
+            Comment.objects.create(post=cls.posts[0], author=cls.user, text=f'comment {i}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def aget(self, url, data=None, **kwargs):
+        return async_to_sync(AsyncClient().get)(url, data, **{'headers': self.headers, **kwargs})
+
+    def test_unauthenticated_and_non_get_requests(self):
+        url = reverse('async-posts')
+        self.assertEqual(self.aget(url, headers={}).status_code, 401)
+        response = async_to_sync(AsyncClient().post)(url, headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+        self.assertIn('detail', response.json())
+
+    def test_lists_match_the_sync_views(self):
+        for sync_name, async_name, params in (
+            ('posts', 'async-posts', {'page_size': 2}),
+            ('global-search', 'async-global-search', {'q': 'django', 'page_size': 2}),
+            ('user-saved-posts', 'async-user-saved-posts', {}),
+        ):
+            with self.subTest(async_name):
+                expected = self.client.get(reverse(sync_name), params).json()
+                response = self.aget(reverse(async_name), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['results'], expected['results'])
+                self.assertEqual(response.json()['next'] is None, expected['next'] is None)
+
+    @override_settings(POSTS_PAGE_SIZE=2)
+    def test_detail_matches_the_sync_view_and_links_the_next_comments(self):
+        pk = self.posts[0].pk
+        expected = self.client.get(reverse('post_detail', args=[pk])).json()
+        data = self.aget(reverse('async-post-detail', args=[pk])).json()
+        self.assertEqual(data, expected)
+        self.assertEqual(len(data['comments']), 2)
+        rest = self.client.get(data['comments_next']).json()
+        self.assertEqual([comment['text'] for comment in rest['results']], ['comment 2'])
+        self.assertEqual(self.aget(reverse('async-post-detail', args=[0])).status_code, 404)
+
+
+def image_bytes(size=(800, 400), color='red'):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+class PhotoVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('author@example.com', 'password')
+        cls.category = Category.objects.create(name='news')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, POSTS_IMAGE_PROCESSING='sync')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Post._meta.get_field('photo').storage
+
+    def save_photo(self, post, name, color):
+        post.photo = SimpleUploadedFile(name, image_bytes(color=color), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        post.refresh_from_db()
+        return post
+
+    def test_render_variants_fit_their_box_without_upscaling(self):
+        for name, content in render_variants(image_bytes()).items():
+            with Image.open(BytesIO(content)) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.size, {'thumbnail': (320, 160), 'large': (800, 400)}[name])
+
+    def test_variants_render_in_a_spawned_process(self):
+        self.addCleanup(setattr, images, '_processes', None)
+        pool = images._process_pool()
+        self.addCleanup(pool.shutdown)
+        self.assertEqual(pool._mp_context.get_start_method(), 'spawn')
+        self.assertEqual(set(pool.submit(render_variants, image_bytes()).result()), set(images.VARIANTS))
+
+    def test_replacing_a_photo_replaces_its_variants(self):
+        post = Post(description='post', text='text', author=self.user, category=self.category)
+        post = self.save_photo(post, 'first.png', 'red')
+        old_source, old_variants = post.photo.name, [post.photo_thumbnail.name, post.photo_large.name]
+        self.assertTrue(all(self.storage.exists(name) for name in old_variants))
+
+        post = self.save_photo(post, 'second.png', 'blue')
+        self.assertTrue(post.photo_thumbnail.name.endswith('second_thumbnail.webp'))
+        self.assertTrue(self.storage.exists(post.photo_large.name))
+        self.assertFalse(any(self.storage.exists(name) for name in old_variants))
+
+        # A late result for the replaced photo is discarded, files included.
+        files = set(self.storage.listdir('post_photos')[1])
+        self.assertFalse(process_post_photo(post.pk, old_source, use_processes=False))
+        self.assertEqual(set(self.storage.listdir('post_photos')[1]), files)
+        self.assertEqual(Post.objects.get(pk=post.pk).photo_thumbnail, post.photo_thumbnail)
+
+
+class CommentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.post = Post.objects.create(
+            description='post', text='text', author=cls.user, category=Category.objects.create(name='news')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_comments_of_a_missing_post_are_not_found(self):
+        self.assertEqual(self.client.get(reverse('comment-create', args=[self.post.pk])).data['results'], [])
+        self.assertEqual(self.client.get(reverse('comment-create', args=[0])).status_code, 404)
+
+
+class PostConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.category = Category.objects.create(name='news')
+        cls.post = Post.objects.create(description='post', text='text', author=cls.user, category=cls.category)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('post_detail', args=[self.post.pk])
+
+    def assertChanged(self, response):
+        changed = self.client.get(self.url, headers={
+            'If-None-Match': response['ETag'], 'If-Modified-Since': response['Last-Modified'],
+        })
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        return changed
+
+    def test_unchanged_post_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']}).status_code, 304
+        )
+
+    def test_post_and_comment_writes_change_the_etag(self):
+        response = self.client.get(self.url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'edited'
+        post.save()
+        self.assertEqual(post.version, self.post.version + 1)
+        response = self.assertChanged(response)
+        Comment.objects.create(post=post, author=self.user, text='comment')
+        self.assertChanged(response)
+
+    def test_category_rename_changes_the_etag(self):
+        response = self.client.get(self.url)
+        self.category.name = 'renamed'
+        self.category.save()
+        self.assertEqual(self.assertChanged(response).data['category']['name'], 'renamed')
+
+
+class FavoriteToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        author = CustomUser.objects.create_user('author@example.com', 'password')
+        cls.post = Post.objects.create(
+            description='post', text='text', author=author, category=Category.objects.create(name='category')
+        )
+        cls.url = reverse('favorite', args=[cls.post.pk])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def favorites_count(self):
+        return Post.objects.values_list('favorites_count', flat=True).get(pk=self.post.pk)
+
+    def test_put_and_delete_are_idempotent_and_keep_the_counter(self):
+        for _ in range(2):
+            response = self.client.put(self.url)
+            self.assertEqual(response.data, {'post': self.post.pk, 'is_favorite': True})
+            self.assertEqual(self.favorites_count(), 1)
+        self.assertTrue(self.post.favorites.filter(pk=self.user.pk).exists())
+
+        for _ in range(2):
+            response = self.client.delete(self.url)
+            self.assertEqual(response.data, {'post': self.post.pk, 'is_favorite': False})
+            self.assertEqual(self.favorites_count(), 0)
+        self.assertFalse(self.post.favorites.filter(pk=self.user.pk).exists())
+
+    def test_toggle_query_count(self):
+        # INSERT + UPDATE, and DELETE + UPDATE, each inside a savepoint.
+        with self.assertNumQueries(4):
+            self.client.put(self.url)
+        with self.assertNumQueries(4):
+            self.client.delete(self.url)
+
+    def test_unknown_post(self):
+        url = reverse('favorite', args=[self.post.pk + 1])
+        self.assertEqual(self.client.put(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertFalse(Post.favorites.through.objects.exists())
+
+    def test_m2m_manager_keeps_the_counter(self):
+        self.post.favorites.add(self.user)
+        self.post.favorites.add(self.user)
+        self.assertEqual(self.favorites_count(), 1)
+        self.user.favorite_posts.remove(self.post, self.post.pk + 1)
+        self.assertEqual(self.favorites_count(), 0)
+        self.user.favorite_posts.add(self.post)
+        self.post.favorites.clear()
+        self.assertEqual(self.favorites_count(), 0)
+
+
+class BulkWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.staff = CustomUser.objects.create_user('staff@example.com', 'password', is_staff=True)
+        cls.category = Category.objects.create(name='news')
+        cls.post = Post.objects.create(description='post', text='text', author=cls.staff, category=cls.category)
+
+    def post_items(self, name, items, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client.post(reverse(name), items, format='json')
+
+    def test_bulk_posts_endpoint(self):
+        item = {'description': 'bulk', 'text': 'text', 'category': self.category.pk}
+        response = self.post_items('posts-bulk', [item, item])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'created'])
+
+        response = self.post_items('posts-bulk', [item, {**item, 'category': 0}, {'text': 'text'}])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error', 'error'])
+        self.assertIn('category', response.data['results'][1]['errors'])
+        self.assertEqual(Post.objects.filter(description='bulk').count(), 3)
+
+        self.assertEqual(self.post_items('posts-bulk', [{**item, 'category': 0}]).status_code, 400)
+        self.assertEqual(self.post_items('posts-bulk', item).status_code, 400)
+
+    @override_settings(POSTS_BULK_MAX_ITEMS=2)
+    def test_bulk_requests_are_limited(self):
+        item = {'post': self.post.pk, 'text': 'comment'}
+        response = self.post_items('comments-bulk', [item] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 2 items', response.data['detail'])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_bulk_comments_endpoint(self):
+        item = {'post': self.post.pk, 'text': 'comment'}
+        self.assertEqual(self.post_items('comments-bulk', [item, item]).status_code, 201)
+        response = self.post_items('comments-bulk', [item, {'post': 0, 'text': 'comment'}])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.post_items('comments-bulk', [{'post': self.post.pk}]).status_code, 400)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+
+    def test_bulk_favorites_endpoint(self):
+        other = Post.objects.create(description='other', text='text', author=self.staff, category=self.category)
+        response = self.post_items('favorites-bulk', [
+            {'post': self.post.pk, 'action': 'add'},
+            {'post': other.pk, 'action': 'add'},
+            {'post': other.pk, 'action': 'remove'},
+            {'post': self.post.pk, 'action': 'add'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['added', 'added', 'removed', 'unchanged'])
+        response = self.post_items('favorites-bulk', [
+            {'post': self.post.pk, 'action': 'remove'}, {'post': 0, 'action': 'add'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.post_items('favorites-bulk', [{'post': self.post.pk, 'action': 'toggle'}]).status_code, 400)
+        self.assertEqual(list(Post.objects.filter(favorites_count__gt=0)), [])
+        self.assertFalse(self.user.favorite_posts.exists())
+
+    def test_only_staff_post_as_another_author(self):
+        item = {'description': 'post', 'text': 'text', 'category': self.category.pk, 'author': self.staff.pk}
+        self.assertIn('author', create_posts([item], self.user)[0]['errors'])
+        result = create_posts([{**item, 'author': self.user.pk}], self.staff)[0]
+        self.assertEqual(Post.objects.get(pk=result['id']).author, self.user)
+
+    def test_favorites_added_concurrently_are_counted_once(self):
+        Favorite = Post.favorites.through
+        filter_favorites = Favorite.objects.filter
+
+        def read_then_lose_the_race(*args, **kwargs):
+            queryset = filter_favorites(*args, **kwargs)
+            if 'post_id__in' not in kwargs or mocked.call_count > 1:
+                return queryset
+            existing = list(queryset.values_list('post_id', flat=True))
+            # Another request favorites the post right after it was read.
+            Favorite.objects.bulk_create([Favorite(post_id=self.post.pk, customuser_id=self.user.pk)])
+            adjust_favorites_counts({self.post.pk: 1})
+            return mock.Mock(values_list=mock.Mock(return_value=existing))
+
+        with mock.patch.object(Favorite.objects, 'filter', side_effect=read_then_lose_the_race) as mocked:
+            apply_favorites([{'post': self.post.pk, 'action': 'add'}], self.user)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.favorites_count, 1)
+
+
+class PostExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin@example.com', 'password')
+        category = Category.objects.create(name='category')
+        cls.posts = [
+            Post.objects.create(description=f'post {i}', text='text', author=cls.admin, category=category)
+            for i in range(3)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.admin, text='comment')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('posts-export'), params)
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return response['X-Export-Watermark'], rows
+
+    def test_export_with_comments(self):
+        _, rows = self.export(comments=1)
+        self.assertEqual([row['id'] for row in rows], [post.pk for post in self.posts])
+        self.assertEqual(rows[0]['category']['name'], 'category')
+        self.assertEqual(rows[0]['author']['email'], self.admin.email)
+        self.assertEqual(rows[0]['comments_count'], 1)
+        self.assertEqual([comment['text'] for comment in rows[0]['comments']], ['comment'])
+        self.assertEqual(rows[1]['comments'], [])
+
+    def test_watermark_trails_the_export(self):
+        with override_settings(POSTS_EXPORT_WATERMARK_LAG=60):
+            watermark, rows = self.export()
+        self.assertLess(parse_since(watermark), timezone.now() - timedelta(seconds=59))
+        # Everything written in the last minute is exported again.
+        self.assertEqual(len(self.export(since=watermark)[1]), len(rows))
+
+    @override_settings(POSTS_EXPORT_WATERMARK_LAG=0)
+    def test_since_watermark_exports_only_changed_posts(self):
+        watermark, _ = self.export()
+        self.assertEqual(self.export(since=watermark)[1], [])
+
+        Comment.objects.create(post=self.posts[2], author=self.admin, text='later')
+        _, rows = self.export(since=watermark)
+        self.assertEqual([row['id'] for row in rows], [self.posts[2].pk])
+        self.assertNotIn('comments', rows[0])
+
+    def test_incremental_batches_walk_ties_on_updated_at(self):
+        since = timezone.now() - timedelta(hours=1)
+        Post.objects.filter(pk__in=[self.posts[0].pk, self.posts[2].pk]).update(updated_at=since)
+        Post.objects.filter(pk=self.posts[1].pk).update(updated_at=since - timedelta(hours=1))
+        rows = list(iter_posts(since, batch_size=1))
+        self.assertEqual([row['id'] for row in rows], [self.posts[0].pk, self.posts[2].pk])
+
+    def test_comments_are_streamed_per_batch(self):
+        Comment.objects.create(post=self.posts[2], author=self.admin, text='second')
+        Comment.objects.create(post=self.posts[2], author=self.admin, text='third')
+        # Two batches of posts, one comment query each, and the empty batch.
+        with self.assertNumQueries(5):
+            rows = list(iter_posts(comments=True, batch_size=2))
+        self.assertEqual(
+            [[comment['text'] for comment in row['comments']] for row in rows],
+            [['comment'], [], ['second', 'third']],
+        )
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('reader@example.com', 'password'))
+        self.assertEqual(self.client.get(reverse('posts-export')).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(reverse('posts-export'), {'since': 'yesterday'}).status_code, 400)
+
+
+class LocalizedDatetimeTests(SimpleTestCase):
+    def test_matches_the_original_implementation(self):
+        values = [
+            # Seconds within one minute share a cache entry.
+            datetime(2024, 1, 15, 9, 30, 0, tzinfo=dt_timezone.utc),
+            datetime(2024, 1, 15, 9, 30, 59, 999999, tzinfo=dt_timezone.utc),
+            datetime(2024, 1, 15, 9, 31, tzinfo=dt_timezone.utc),
+            # Either side of the European and US DST changes.
+            datetime(2024, 3, 31, 0, 59, 59, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 31, 1, 0, tzinfo=dt_timezone.utc),
+            datetime(2024, 11, 3, 5, 59, 59, tzinfo=dt_timezone.utc),
+            datetime(2024, 11, 3, 6, 0, tzinfo=dt_timezone.utc),
+            # Local mean time, whose offset isn't a whole number of minutes.
+            datetime(1900, 6, 1, 12, 0, 50, tzinfo=dt_timezone.utc),
+            datetime(2024, 12, 31, 23, 59, 30, tzinfo=ZoneInfo('Asia/Kathmandu')),
+        ]
+        for name in ('UTC', 'Europe/Moscow', 'Europe/Berlin', 'America/New_York', 'Asia/Kolkata'):
+            with timezone.override(ZoneInfo(name)):
+                for value in values:
+                    with self.subTest(timezone=name, value=value):
+                        self.assertEqual(format_localized_datetime(value), legacy_format_localized_datetime(value))
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    def results(self, p95, queries):
+        return {'routes': {'GET posts': {'p95_ms': p95, 'queries': queries}}}
+
+    def test_regressions_beyond_the_threshold_are_reported(self):
+        baseline = self.results(10.0, 2)
+        self.assertEqual(compare(self.results(12.0, 2), baseline, 0.25), [])
+        self.assertEqual(len(compare(self.results(13.0, 2), baseline, 0.25)), 1)
+        self.assertEqual(len(compare(self.results(10.0, 3), baseline, 0.25)), 1)
+        self.assertEqual(len(compare({'routes': {'GET posts': {'error': 'failed'}}}, baseline, 0.25)), 1)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([7], 99), 7)
@@ -1,5 +1,6 @@
 from django.urls import path
 
+from . import async_views
 from .views import (
     CategoryCreateView,
     PostCreateView,
@@ -14,7 +15,12 @@ from .views import (
     CategoryFilterView,
     AddToFavoritesView,
     RemoveFromFavoritesView,
-    UserSavedPostsView
+    FavoriteView,
+    UserSavedPostsView,
+    BulkPostCreateView,
+    BulkCommentCreateView,
+    BulkFavoritesView,
+    PostExportView
 )
 
 urlpatterns = [
@@ -31,5 +37,14 @@ urlpatterns = [
     path('comments/<int:pk>/delete/', CommentDeleteAPIView.as_view(), name='comment-delete'),
     path('post/<int:pk>/add-to-favorites/', AddToFavoritesView.as_view(), name='add-to-favorites'),
     path('post/<int:pk>/remove-from-favorites/', RemoveFromFavoritesView.as_view(), name='remove-from-favorites'),
+    path('post/<int:pk>/favorite/', FavoriteView.as_view(), name='favorite'),
     path('user/saved-posts/', UserSavedPostsView.as_view(), name='user-saved-posts'),
+    path('posts/bulk/', BulkPostCreateView.as_view(), name='posts-bulk'),
+    path('comments/bulk/', BulkCommentCreateView.as_view(), name='comments-bulk'),
+    path('favorites/bulk/', BulkFavoritesView.as_view(), name='favorites-bulk'),
+    path('posts/export/', PostExportView.as_view(), name='posts-export'),
+    path('async/search/', async_views.global_search, name='async-global-search'),
+    path('async/posts/', async_views.post_list, name='async-posts'),
+    path('async/post/<int:pk>/', async_views.post_detail, name='async-post-detail'),
+    path('async/user/saved-posts/', async_views.saved_posts, name='async-user-saved-posts'),
 ]
@@ -1,20 +1,27 @@
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from django.db.models import Subquery, OuterRef
-from django.db.models import Count, Q
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
 from .models import (
     Category,
     Post,
-    Comment
+    Comment,
+    add_favorite,
+    favorite_post_ids,
+    remove_favorite
 )
 from .serializers import (
     CategorySerializer,
+    CategoryStatsSerializer,
     PostSerializer,
+    PostListSerializer,
     PostCreateUpdateSerializer,
     CommentCreateSerializer,
     CommentSerializer,
@@ -24,30 +31,53 @@ from .permissions import (
     IsOwnerOrAdminPermission,
     IsCommentOwnerOrPostAuthorOrAdmin
 )
-
-
-class GlobalSearchView(generics.ListAPIView):
-    serializer_class = PostSerializer
+from .bulk import apply_favorites, create_comments, create_posts
+from .cache import CachedResponseMixin
+from .categories import registry as category_registry
+from .export import export_posts, format_watermark, parse_since
+from .pagination import CommentCursorPagination, PostCursorPagination, SearchCursorPagination
+from .search import search_posts
+
+
+class FavoriteFlagsMixin:
+    """
+    Resolve which posts of the current page the requesting user has favorited
+    with a single query and hand the ids to the serializer.
+    """
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        posts = queryset if page is None else page
+        self.favorite_post_ids = favorite_post_ids(self.request.user, [post.pk for post in posts])
+        return page
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if hasattr(self, 'favorite_post_ids'):
+            context['favorite_post_ids'] = self.favorite_post_ids
+        return context
+
+
+class GlobalSearchView(CachedResponseMixin, FavoriteFlagsMixin, generics.ListAPIView):
+    serializer_class = PostListSerializer
     permission_classes = [IsAuthenticated]
-
-    @method_decorator(cache_page(60*5))  # Cache for 5 minutes
-    def get(self, request, *args, **kwargs):
-        return self.list(request, *args, **kwargs)
+    pagination_class = SearchCursorPagination
 
     def get_queryset(self):
         query = self.request.GET.get('q', '')
-        return Post.objects.filter(
-            Q(description__icontains=query) | Q(text__icontains=query)
-        ).annotate(total_comments=Count('post_comments')).order_by('-publication_date')
+        return search_posts(Post.objects.for_listing(), query)
 
 
-class CategoryFilterView(generics.ListAPIView):
-    serializer_class = PostSerializer
+class CategoryFilterView(CachedResponseMixin, FavoriteFlagsMixin, generics.ListAPIView):
+    serializer_class = PostListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
-        category_name = self.kwargs.get('category_name')
-        return Post.objects.filter(category__name=category_name).annotate(comments_count=Count('post_comments')).order_by('-publication_date')
+        category_id = category_registry.id_for(self.kwargs.get('category_name'))
+        if category_id is None:
+            return Post.objects.none()
+        return Post.objects.for_listing().filter(category_id=category_id).order_by('-publication_date')
 
 
 class CategoryCreateView(generics.ListCreateAPIView):
@@ -55,6 +85,16 @@ class CategoryCreateView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return CategoryStatsSerializer
+        return CategorySerializer
+
+    def list(self, request, *args, **kwargs):
+        # One LEFT JOIN onto the materialized stats, no per-category counting.
+        categories = Category.objects.select_related('stats').order_by('pk')
+        return Response(self.get_serializer(categories, many=True).data)
+
 
 class PostCreateView(generics.CreateAPIView):
     queryset = Post.objects.all()
@@ -62,24 +102,50 @@ class PostCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class PostListView(generics.ListAPIView):
-    queryset = Post.objects.annotate(comments_count=Count('post_comments')).order_by('-publication_date')
-    serializer_class = PostSerializer
+class PostListView(CachedResponseMixin, FavoriteFlagsMixin, generics.ListAPIView):
+    queryset = Post.objects.for_listing().order_by('-publication_date')
+    serializer_class = PostListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
+
+
+def post_version(request, pk):
+    """(version, updated_at) of the post, looked up once per request."""
+    if not hasattr(request, 'post_version'):
+        request.post_version = Post.objects.filter(pk=pk).values_list('version', 'updated_at').first()
+    return request.post_version
+
+
+def post_etag(request, pk):
+    version = post_version(request, pk)
+    return f'post-{pk}-v{version[0]}' if version else None
+
+
+def post_last_modified(request, pk):
+    version = post_version(request, pk)
+    return version[1] if version else None
 
 
 class PostRetrieveAPIView(generics.RetrieveAPIView):
-    queryset = Post.objects.all()
+    queryset = Post.objects.select_related('author')
     serializer_class = PostDetailSerializer
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=post_etag, last_modified_func=post_last_modified))
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        comments = Comment.objects.filter(post=instance)
-        post_serializer = self.get_serializer(instance)
-        comment_serializer = CommentSerializer(comments, many=True)
-        data = post_serializer.data
-        data['comments'] = comment_serializer.data
+        paginator = CommentCursorPagination()
+        comments = paginator.first_page(
+            Comment.objects.filter(post=instance).select_related('author'), request
+        )
+        data = self.get_serializer(instance).data
+        data['comments'] = CommentSerializer(comments, many=True).data
+        data['comments_next'] = paginator.get_next_link(
+            reverse('comment-create', args=[instance.pk], request=request)
+        )
         return Response(data)
 
 
@@ -95,16 +161,28 @@ class PostDeleteAPIView(generics.DestroyAPIView):
     permission_classes = [IsOwnerOrAdminPermission]
 
 
-class CommentCreateAPIView(generics.CreateAPIView):
-    queryset = Comment.objects.all()
+class CommentCreateAPIView(generics.ListCreateAPIView):
     serializer_class = CommentCreateSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentCursorPagination
+
+    def get_queryset(self):
+        return Comment.objects.filter(post_id=self.kwargs['pk']).select_related('author')
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return CommentSerializer
+        return CommentCreateSerializer
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Only an empty page needs the extra query to tell a missing post apart.
+        if not response.data['results'] and not Post.objects.filter(pk=self.kwargs['pk']).exists():
+            raise NotFound()
+        return response
 
     def perform_create(self, serializer):
-        comment = serializer.save(author=self.request.user)
-        post = comment.post
-        post.comments.add(comment)
-        post.save()
+        serializer.save(author=self.request.user)
 
 
 class CommentUpdateAPIView(generics.UpdateAPIView):
@@ -127,14 +205,10 @@ class AddToFavoritesView(generics.UpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         post = self.get_object()
-        user = self.request.user
 
-        if user in post.favorites.all():
+        if not add_favorite(post.pk, request.user.pk):
             return Response({"detail": "Post is already in favorites."}, status=status.HTTP_400_BAD_REQUEST)
 
-        post.favorites.add(user)
-        post.save()
-
         serializer = self.get_serializer(post)
         return Response(serializer.data)
 
@@ -147,22 +221,107 @@ class RemoveFromFavoritesView(generics.UpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         post = self.get_object()
-        user = self.request.user
 
-        if user not in post.favorites.all():
+        if not remove_favorite(post.pk, request.user.pk):
             return Response({"detail": "Post is not in favorites."}, status=status.HTTP_400_BAD_REQUEST)
 
-        post.favorites.remove(user)
-        post.save()
-
         serializer = self.get_serializer(post)
         return Response(serializer.data)
 
 
-class UserSavedPostsView(generics.ListAPIView):
-    serializer_class = PostSerializer
+class FavoriteView(generics.GenericAPIView):
+    """
+    PUT favorites the post and DELETE unfavorites it. Both are idempotent and
+    touch only the through row and the post's favorites_count.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, pk):
+        try:
+            add_favorite(pk, request.user.pk)
+        except Post.DoesNotExist:
+            raise NotFound()
+        return Response({'post': pk, 'is_favorite': True})
+
+    def delete(self, request, pk):
+        # Only a no-op delete needs to tell a missing post from a non-favorite.
+        if not remove_favorite(pk, request.user.pk) and not Post.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return Response({'post': pk, 'is_favorite': False})
+
+
+class UserSavedPostsView(CachedResponseMixin, FavoriteFlagsMixin, generics.ListAPIView):
+    serializer_class = PostListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return user.favorite_posts.all()
+        return user.favorite_posts.for_listing()
+
+
+class BulkWriteView(generics.GenericAPIView):
+    """
+    Accepts a JSON array of items and returns one result per item. Responds
+    with ``success_status`` when every item succeeded, 400 when none did and
+    207 Multi-Status otherwise.
+    """
+    permission_classes = [IsAuthenticated]
+    bulk_write = None
+    success_status = status.HTTP_201_CREATED
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of items."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.POSTS_BULK_MAX_ITEMS:
+            return Response({"detail": f"At most {settings.POSTS_BULK_MAX_ITEMS} items per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = self.bulk_write(items, request.user)
+        failed = sum(result['status'] == 'error' for result in results)
+        if not failed:
+            response_status = self.success_status
+        elif failed == len(results):
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response({'results': results}, status=response_status)
+
+
+class BulkPostCreateView(BulkWriteView):
+    bulk_write = staticmethod(create_posts)
+
+
+class BulkCommentCreateView(BulkWriteView):
+    bulk_write = staticmethod(create_comments)
+
+
+class BulkFavoritesView(BulkWriteView):
+    bulk_write = staticmethod(apply_favorites)
+    success_status = status.HTTP_200_OK
+
+
+class PostExportView(generics.GenericAPIView):
+    """
+    Staff-only NDJSON stream of every post, see posts.export. ``?since=``
+    limits it to posts updated since a previous export's watermark, which is
+    returned in the X-Export-Watermark header; ``?comments=1`` nests comments.
+    Deleted posts only drop out of a full export.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_since(since)
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        comments = request.query_params.get('comments', '').lower() in ('1', 'true', 'yes')
+
+        watermark, lines = export_posts(since=since or None, comments=comments)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['X-Export-Watermark'] = format_watermark(watermark)
+        response['Content-Disposition'] = 'attachment; filename="posts.ndjson"'
+        return response
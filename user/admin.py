@@ -1,5 +1,15 @@
 from django.contrib import admin
 
-from .models import CustomUser
+from .models import CustomUser, OutboundEmail
 
 admin.site.register(CustomUser)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    # The body may carry a password-reset code; it is never shown.
+    exclude = ('body',)
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('subject', 'from_email', 'recipients', 'status', 'attempts', 'next_attempt_at',
+                       'last_error', 'created_at', 'sent_at')
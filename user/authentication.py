@@ -0,0 +1,49 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through user.cache
+    instead of querying the user table on every request. The same checks
+    as simplejwt's are applied to the cached row.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user_cache = get_user_cache()
+        if not user_cache.enabled:
+            return super().get_user(validated_token)
+
+        user = user_cache.get(user_id)
+        if user is not None and not self.password_matches(validated_token, user):
+            # A token issued after a password change in another process;
+            # the cached row is what's stale, not the token.
+            user = None
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if not self.password_matches(validated_token, user):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    @staticmethod
+    def password_matches(validated_token, user):
+        if not api_settings.CHECK_REVOKE_TOKEN:
+            return True
+        return validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) == get_md5_hash_password(user.password)
@@ -0,0 +1,103 @@
+"""
+Short-lived cache of user rows for request authentication.
+
+Entries live in a per-process LRU for ``USER_CACHE_TTL`` seconds and, when
+``USER_CACHE_ALIAS`` names a configured cache, in that shared cache too so
+a freshly started worker doesn't go to the database for every user. Saving
+or deleting a user evicts it from both; other processes drop their local
+copy when its TTL runs out, which bounds how long a deactivated user or a
+changed password can go unnoticed there. Queryset ``update()`` calls bypass
+the eviction and are only picked up by the TTL as well.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+KEY = 'user:auth:{}'
+
+
+class UserCache:
+    def __init__(self, ttl, max_size, shared=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id):
+        """Return a private copy of the cached user, or None."""
+        key = KEY.format(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, user = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return copy.copy(user)
+                del self._entries[key]
+        if self.shared is None:
+            return None
+        user = self.shared.get(key)
+        if user is not None:
+            self._remember(key, copy.copy(user))
+        return user
+
+    def set(self, user_id, user):
+        key = KEY.format(user_id)
+        self._remember(key, copy.copy(user))
+        if self.shared is not None:
+            self.shared.set(key, user, self.ttl)
+
+    def delete(self, user_id):
+        key = KEY.format(user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_user_cache = None
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        alias = settings.USER_CACHE_ALIAS
+        _user_cache = UserCache(
+            settings.USER_CACHE_TTL,
+            settings.USER_CACHE_MAX_SIZE,
+            caches[alias] if alias else None,
+        )
+    return _user_cache
+
+
+def evict_user(user_id):
+    get_user_cache().delete(user_id)
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting, **kwargs):
+    global _user_cache
+    if setting.startswith('USER_CACHE_'):
+        _user_cache = None
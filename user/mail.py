@@ -0,0 +1,115 @@
+"""
+Outbound mail queue.
+
+Views call ``enqueue_mail`` instead of ``send_mail``, which only inserts an
+OutboundEmail row, so no request waits on an SMTP handshake. The
+send_queued_mail command delivers due messages in batches over a single
+backend connection. Each batch is claimed by pushing its rows'
+``next_attempt_at`` past ``EMAIL_QUEUE_LEASE`` seconds (with SKIP LOCKED
+where the database has it) so several workers can run side by side and a
+worker that dies mid-batch only delays its messages. Failed deliveries are
+retried with exponential backoff until ``EMAIL_QUEUE_MAX_ATTEMPTS``.
+
+Bodies can hold secrets such as reset codes, so a message's body is
+cleared once it is sent or has failed for good, and ``purge_finished_mail``
+deletes finished rows so the table doesn't grow without bound.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    return OutboundEmail.objects.create(
+        subject=subject, body=message, from_email=from_email, recipients=list(recipient_list)
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(
+        settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1), settings.EMAIL_QUEUE_MAX_RETRY_DELAY
+    ))
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            status=OutboundEmail.PENDING, next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'pk')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_QUEUE_LEASE)
+        )
+    return batch
+
+
+def deliver(email, connection):
+    message = EmailMessage(email.subject, email.body, email.from_email, email.recipients, connection=connection)
+    email.attempts += 1
+    try:
+        # No-op while the connection is up; reconnects after a failure.
+        connection.open()
+        message.send()
+    except Exception as exc:
+        logger.warning('Sending outbound email %s failed (attempt %s): %s', email.pk, email.attempts, exc)
+        # Drop a connection the server may have closed; the next message reopens it.
+        connection.close()
+        email.last_error = f'{type(exc).__name__}: {exc}'
+        if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            email.status = OutboundEmail.FAILED
+            email.body = ''
+        else:
+            email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'body'])
+        return False
+    email.status = OutboundEmail.SENT
+    email.sent_at = timezone.now()
+    email.body = ''
+    email.save(update_fields=['attempts', 'status', 'sent_at', 'body'])
+    return True
+
+
+def send_queued_mail(batch_size=None, connection=None):
+    """
+    Deliver every message that is due, one batch at a time over one
+    connection. Returns ``(sent, failed)`` counts for this run.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                return sent, failed
+            for email in batch:
+                if deliver(email, connection):
+                    sent += 1
+                else:
+                    failed += 1
+    finally:
+        connection.close()
+
+
+def purge_finished_mail(older_than, batch_size=1000):
+    """Delete sent and failed messages created more than ``older_than`` ago, in primary key batches."""
+    finished = OutboundEmail.objects.filter(
+        status__in=[OutboundEmail.SENT, OutboundEmail.FAILED], created_at__lt=timezone.now() - older_than
+    ).order_by('pk')
+    purged = 0
+    while True:
+        ids = list(finished.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += OutboundEmail.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,56 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from user.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Measure logins per second on one core through the login endpoint with the '
+            'configured password hasher, next to the cost of a single password check.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20)
+        parser.add_argument('--password', default='benchmark-Password-1')
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1:
+            raise CommandError('--logins must be at least 1.')
+        password = options['password']
+        hasher = get_hasher()
+        encoded = make_password(password)
+        hash_seconds = self.time(lambda: check_password(password, encoded), options['logins'])
+
+        # The throwaway user is rolled back together with everything the logins wrote.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            user = CustomUser.objects.create_user('login-benchmark@example.invalid', password)
+            client = Client()
+            url = reverse('login')
+
+            def login():
+                response = client.post(url, {'email': user.email, 'password': password})
+                if response.status_code != 200:
+                    raise CommandError(f'POST {url} returned {response.status_code}')
+
+            login_seconds = self.time(login, options['logins'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'hasher: {hasher.algorithm} ({settings.PASSWORD_HASHERS[0]})')
+        self.stdout.write(f'password check: {1 / hash_seconds:8.1f}/s ({hash_seconds * 1000:.1f} ms)')
+        self.stdout.write(f'login:          {1 / login_seconds:8.1f}/s per core ({login_seconds * 1000:.1f} ms)')
+        self.stdout.write(f'hashes per login: {login_seconds / hash_seconds:.2f}')
+        self.stdout.write(f'cores available: {os.cpu_count()} -> ~{os.cpu_count() / login_seconds:.0f} logins/s')
+
+    @staticmethod
+    def time(func, number):
+        func()  # warm up imports and connections
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - started) / number
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from user.models import OTP
+
+
+class Command(BaseCommand):
+    help = 'Delete expired password-reset codes in primary key batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        purged = 0
+        while True:
+            ids = list(OTP.objects.expired().order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            purged += OTP.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired OTP(s).'))
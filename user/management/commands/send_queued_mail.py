@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from user.mail import purge_finished_mail, send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound email over a single connection, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Messages claimed per batch (default: EMAIL_QUEUE_BATCH_SIZE).')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop.')
+        parser.add_argument('--purge-older-than', type=float, metavar='DAYS',
+                            help='Also delete sent and failed messages created more than DAYS days ago.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_mail(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f'Sent {sent} message(s), {failed} failed.')
+            if options['purge_older_than'] is not None:
+                purged = purge_finished_mail(timedelta(days=options['purge_older_than']))
+                if purged or not options['loop']:
+                    self.stdout.write(f'Purged {purged} finished message(s).')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
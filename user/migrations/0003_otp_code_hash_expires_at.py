@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils.crypto import salted_hmac
+
+
+def hash_otp(user_id, code):
+    # A frozen copy of user.models.hash_otp as of this migration.
+    return salted_hmac('user.OTP', f'{user_id}:{code}', algorithm='sha256').hexdigest()
+
+
+def hash_existing_codes(apps, schema_editor):
+    OTP = apps.get_model('user', 'OTP')
+    otps = list(OTP.objects.only('user_id', 'otp', 'created_at'))
+    for otp in otps:
+        otp.code_hash = hash_otp(otp.user_id, otp.otp)
+        # The lifetime is_expired used to enforce.
+        otp.expires_at = otp.created_at + timedelta(minutes=5)
+    OTP.objects.bulk_update(otps, ['code_hash', 'expires_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='code_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(hash_existing_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='otp',
+            name='otp',
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['user', 'code_hash'], name='otp_user_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['expires_at'], name='otp_expires_at_idx'),
+        ),
+    ]
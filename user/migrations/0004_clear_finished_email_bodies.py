@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def clear_finished_bodies(apps, schema_editor):
+    OutboundEmail = apps.get_model('user', 'OutboundEmail')
+    OutboundEmail.objects.filter(status__in=['sent', 'failed']).exclude(body='').update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_otp_code_hash_expires_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_finished_bodies, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-import random
+import secrets
 import string
+from datetime import timedelta
 
 from django.contrib.auth.models import (
     BaseUserManager,
@@ -7,8 +8,14 @@ from django.contrib.auth.models import (
     PermissionsMixin
 )
 
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .cache import evict_user
 
 
 class CustomUserManager(BaseUserManager):
@@ -47,18 +54,87 @@ class CustomUser(PermissionsMixin, AbstractBaseUser):
         return self.email
 
 
+def hash_otp(user_id, code):
+    """HMAC of a one-time code, bound to its user so equal codes never collide."""
+    return salted_hmac('user.OTP', f'{user_id}:{code}', algorithm='sha256').hexdigest()
+
+
+class OTPQuerySet(models.QuerySet):
+    def unexpired(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+    def matching(self, user, code):
+        return self.unexpired().filter(user=user, code_hash=hash_otp(user.pk, code))
+
+
 class OTP(models.Model):
+    LENGTH = 4
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    otp = models.CharField(max_length=4)
+    code_hash = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = OTPQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'code_hash'], name='otp_user_code_idx'),
+            models.Index(fields=['expires_at'], name='otp_expires_at_idx'),
+        ]
 
     @staticmethod
     def generate_otp():
-        digits = string.digits
-        return ''.join(random.choice(digits) for i in range(4))
+        return ''.join(secrets.choice(string.digits) for i in range(OTP.LENGTH))
+
+    @classmethod
+    def issue(cls, user):
+        """Replace the user's codes with a fresh one and return it in clear text."""
+        code = cls.generate_otp()
+        cls.objects.filter(user=user).delete()
+        cls.objects.create(
+            user=user,
+            code_hash=hash_otp(user.pk, code),
+            expires_at=timezone.now() + timedelta(seconds=settings.OTP_TTL),
+        )
+        return code
 
     @property
     def is_expired(self):
-        time_threshold = timezone.now() - timezone.timedelta(minutes=5)
-        return self.created_at < time_threshold
+        return self.expires_at <= timezone.now()
+
+
+class OutboundEmail(models.Model):
+    """A message waiting for, or done with, delivery by the send_queued_mail worker."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)}'
+
 
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def evict_cached_user(sender, instance, **kwargs):
+    evict_user(instance.pk)
@@ -0,0 +1,5 @@
+from posts.pagination import KeysetPagination
+
+
+class UserCursorPagination(KeysetPagination):
+    ordering = ('id',)
@@ -69,24 +69,24 @@ class ForgotPasswordSerializer(serializers.Serializer):
 
 
 class ResetPasswordSerializer(serializers.Serializer):
-    otp = serializers.CharField(max_length=4)
+    email = serializers.EmailField()
+    otp = serializers.CharField(max_length=OTP.LENGTH)
     password = serializers.CharField(write_only=True)
     confirm_password = serializers.CharField(write_only=True)
 
     def validate(self, data):
+        email = data.get('email')
         otp = data.get('otp')
         password = data.get('password')
         confirm_password = data.get('confirm_password')
         validate_password_match(password, confirm_password)
         validate_password(password)
 
-        try:
-            otp_obj = OTP.objects.get(otp=otp)
-            if otp_obj.is_expired:
-                raise serializers.ValidationError({'error': "OTP has expired."})
-            data['user'] = otp_obj.user
-        except OTP.DoesNotExist:
-            raise serializers.ValidationError({'error': "Invalid OTP."})
+        # Expired codes are filtered out by the query, so they read as invalid.
+        user = CustomUser.objects.filter(email=email).first()
+        if user is None or not OTP.objects.matching(user, otp).exists():
+            raise serializers.ValidationError({'error': "Invalid or expired OTP."})
+        data['user'] = user
 
         return data
 
@@ -1,3 +1,183 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hasher
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import UserCache, get_user_cache
+from .mail import enqueue_mail, send_queued_mail
+from .models import OTP, CustomUser, OutboundEmail
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+
+    def setUp(self):
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = reverse('user-saved-posts')
+
+    @override_settings(POSTS_CACHE_TIMEOUT=0)
+    def test_user_is_loaded_once(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_deactivation_evicts_the_cached_user(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deletion_evicts_the_cached_user(self):
+        self.client.get(self.url)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_shared_cache_hits_are_private_copies(self):
+        shared = caches['default']
+        self.addCleanup(shared.clear)
+        UserCache(30, 8, shared).set(self.user.pk, self.user)
+
+        # A fresh worker fills its local LRU from the shared cache.
+        worker = UserCache(30, 8, shared)
+        user = worker.get(self.user.pk)
+        user.is_active = False
+        self.assertTrue(worker.get(self.user.pk).is_active)
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+
+    def test_password_is_hashed_once(self):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+            response = self.client.post(reverse('login'), {'email': self.user.email, 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_invalid_credentials(self):
+        response = self.client.post(reverse('login'), {'email': self.user.email, 'password': 'wrong'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OutboundEmailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+
+    def test_forgot_password_queues_the_otp(self):
+        response = self.client.post(reverse('forgot_password'), {'email': self.user.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(OutboundEmail.objects.values_list('status', 'body').get(), (OutboundEmail.SENT, ''))
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+    def test_finished_messages_are_purged(self):
+        for _ in range(3):
+            enqueue_mail('subject', 'body', 'from@example.com', [self.user.email])
+        send_queued_mail()
+        pending = enqueue_mail('subject', 'body', 'from@example.com', [self.user.email])
+        OutboundEmail.objects.update(created_at=timezone.now() - timedelta(days=8))
+        OutboundEmail.objects.filter(pk=pending.pk).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        out = StringIO()
+        call_command('send_queued_mail', '--batch-size=1', '--purge-older-than=7', stdout=out)
+        self.assertIn('Purged 3 finished message(s).', out.getvalue())
+        self.assertEqual(list(OutboundEmail.objects.values_list('pk', 'body')), [(pending.pk, 'body')])
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2)
+    def test_failures_are_retried_with_backoff(self):
+        email = enqueue_mail('subject', 'body', 'from@example.com', [self.user.email])
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('down')):
+            self.assertEqual(send_queued_mail(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.PENDING, 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('down')):
+            self.assertEqual(send_queued_mail(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.body), (OutboundEmail.FAILED, 2, ''))
+        self.assertEqual(mail.outbox, [])
+
+
+class PasswordResetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('reader@example.com', 'password')
+        cls.other = CustomUser.objects.create_user('other@example.com', 'password')
+
+    def reset(self, email, otp):
+        return self.client.post(reverse('reset_password'), {
+            'email': email, 'otp': otp, 'password': 'New-password-1!', 'confirm_password': 'New-password-1!'
+        })
+
+    def test_code_is_stored_hashed_and_bound_to_its_user(self):
+        code = OTP.issue(self.user)
+        self.assertNotIn(code, OTP.objects.get().code_hash)
+        self.assertEqual(self.reset(self.other.email, code).status_code, 400)
+
+        self.assertEqual(self.reset(self.user.email, code).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('New-password-1!'))
+        self.assertFalse(OTP.objects.exists())
+
+    def test_expired_code_is_rejected_and_purged(self):
+        code = OTP.issue(self.user)
+        OTP.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.reset(self.user.email, code).status_code, 400)
+
+        call_command('purge_expired_otps', stdout=StringIO())
+        self.assertFalse(OTP.objects.exists())
+
+
+class UserListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin@example.com', 'password')
+        for i in range(4):
+            CustomUser.objects.create_user(f'user{i}@example.com', 'password')
+
+    def test_listing_is_paginated(self):
+        emails = []
+        url = reverse('users') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            emails += [user['email'] for user in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(emails, list(CustomUser.objects.order_by('id').values_list('email', flat=True)))
+
+    def test_export_streams_every_user_to_admins(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('users-export')).status_code, 401)
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('users-export'))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, list(CustomUser.objects.order_by('id').values('id', 'email')))
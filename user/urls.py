@@ -5,7 +5,8 @@ from .views import (
     CustomLoginView,
     ForgotPasswordView,
     ResetPasswordView,
-    Users
+    Users,
+    UsersExportView
 )
 
 urlpatterns = [
@@ -13,5 +14,6 @@ urlpatterns = [
     path('login/', CustomLoginView.as_view(), name='login'),
     path('forgot-password/', ForgotPasswordView.as_view(), name='forgot_password'),
     path('reset-password/', ResetPasswordView.as_view(), name='reset_password'),
-    path('users/', Users.as_view(), name='users')
+    path('users/', Users.as_view(), name='users'),
+    path('users/export/', UsersExportView.as_view(), name='users-export')
 ]